@@ -0,0 +1,24 @@
+"""
+Общие утилиты фоновых сервисов (archivist, dreamer).
+Подключается в образ через additional_contexts в docker-compose.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from loguru import logger
+
+
+async def run_daily(hour: int, minute: int, job):
+    """
+    Запускает job каждый день в hh:mm (время контейнера) без внешнего планировщика.
+    Исключение в job логируется и не останавливает расписание.
+    """
+    while True:
+        now = datetime.now()
+        next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        await asyncio.sleep((next_run - now).total_seconds())
+        try:
+            await job()
+        except Exception as e:
+            logger.exception(f"Scheduled job {job.__name__} failed: {e}")
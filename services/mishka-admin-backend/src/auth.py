@@ -78,6 +78,6 @@ class UserRole(str, Enum):
 def get_user_role(user_id: int) -> Optional[str]:
     if user_id == settings.SUPERADMIN_ID:
         return UserRole.SUPERADMIN
-    if user_id in settings.viewer_ids_list:
+    if user_id in settings.viewer_ids:
         return UserRole.VIEWER
     return None
@@ -1,7 +1,22 @@
 import os
-from typing import List
+from functools import lru_cache
+from typing import FrozenSet
 from pydantic_settings import BaseSettings
 
+
+@lru_cache(maxsize=8)
+def _parse_id_list(raw: str) -> FrozenSet[int]:
+    """
+    Парсит CSV со списком Telegram ID в frozenset: проверка роли — O(1)
+    при любом числе viewer-ов. Кэшируется по самой строке:
+    пока значение не меняется, повторный разбор не выполняется.
+    """
+    try:
+        # int() сам отбрасывает пробелы вокруг числа
+        return frozenset(int(x) for x in raw.split(",") if x.strip())
+    except ValueError:
+        return frozenset()
+
 class Settings(BaseSettings):
     # Security
     ADMIN_PASSWORD: str = "change_me_please" # Default for dev if missing
@@ -32,12 +47,8 @@ class Settings(BaseSettings):
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
 
     @property
-    def viewer_ids_list(self) -> List[int]:
-        if not self.VIEWER_IDS: return []
-        try:
-            return [int(x.strip()) for x in self.VIEWER_IDS.split(",") if x.strip()]
-        except ValueError:
-            return []
+    def viewer_ids(self) -> FrozenSet[int]:
+        return _parse_id_list(self.VIEWER_IDS)
 
     class Config:
         env_file = ".env"
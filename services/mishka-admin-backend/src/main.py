@@ -92,15 +92,19 @@ async def get_stats(current_user: Annotated[dict, Depends(get_current_user)]):
         "facts_in_memory": 42
     }
 
+SENSITIVE_KEYS = ("key", "token", "secret", "pass", "password")
+
 def sanitize_config(config: dict) -> dict:
     """Mask sensitive fields recursively."""
-    sensitive_keys = ["key", "token", "secret", "pass", "password"]
-    sanitized = config.copy()
-    for k, v in sanitized.items():
+    # Результат собирается за один проход, без copy() и перезаписи ключей
+    sanitized = {}
+    for k, v in config.items():
         if isinstance(v, dict):
             sanitized[k] = sanitize_config(v)
-        elif isinstance(k, str) and any(s in k.lower() for s in sensitive_keys):
+        elif isinstance(k, str) and any(s in k.lower() for s in SENSITIVE_KEYS):
             sanitized[k] = "********"
+        else:
+            sanitized[k] = v
     return sanitized
 
 @app.get("/tools")
@@ -214,95 +218,55 @@ async def get_service_config(service_name: str, db: AsyncSession = Depends(get_d
 
 PERSONALITY_SERVICE_URL = "http://mishka-personality:8000"
 
-@app.get("/admin/personalities")
-async def get_personalities(current_user: Annotated[dict, Depends(get_current_user)]):
+async def _personality_request(method: str, path: str, payload: dict = None, timeout: float = 5.0, check_status: bool = True):
+    """
+    Проксирует запрос в Personality Service и возвращает JSON ответа.
+    Ошибка статуса отдаётся клиенту как есть, сетевые и прочие ошибки — как 502.
+    """
     import httpx
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(f"{PERSONALITY_SERVICE_URL}/personalities", timeout=5.0)
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            resp = await client.request(method, f"{PERSONALITY_SERVICE_URL}{path}", json=payload)
+            if check_status and resp.status_code != 200:
+                raise HTTPException(status_code=resp.status_code, detail=resp.text)
             return resp.json()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Personality Service Error: {e}")
 
+@app.get("/admin/personalities")
+async def get_personalities(current_user: Annotated[dict, Depends(get_current_user)]):
+    return await _personality_request("GET", "/personalities", check_status=False)
+
 @app.post("/admin/personalities")
 async def create_personality(payload: dict, admin: Annotated[dict, Depends(require_superadmin)]):
-    import httpx
-    try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(f"{PERSONALITY_SERVICE_URL}/personalities", json=payload, timeout=5.0)
-            return resp.json()
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Personality Service Error: {e}")
+    return await _personality_request("POST", "/personalities", payload, check_status=False)
 
 @app.put("/admin/personalities/{p_id}")
 async def update_personality(p_id: str, payload: dict, admin: Annotated[dict, Depends(require_superadmin)]):
-    import httpx
-    try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.put(f"{PERSONALITY_SERVICE_URL}/personalities/{p_id}", json=payload, timeout=5.0)
-            if resp.status_code != 200:
-                raise HTTPException(status_code=resp.status_code, detail=resp.text)
-            return resp.json()
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Personality Service Error: {e}")
+    return await _personality_request("PUT", f"/personalities/{p_id}", payload)
 
 @app.post("/admin/personalities/{p_id}/activate")
 async def activate_personality(p_id: str, admin: Annotated[dict, Depends(require_superadmin)]):
-    import httpx
-    try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(f"{PERSONALITY_SERVICE_URL}/personalities/{p_id}/activate", timeout=5.0)
-            if resp.status_code != 200:
-                raise HTTPException(status_code=resp.status_code, detail=resp.text)
-            return resp.json()
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Personality Service Error: {e}")
+    return await _personality_request("POST", f"/personalities/{p_id}/activate")
 
 @app.post("/admin/personalities/evolve")
 async def trigger_evolution(payload: dict, admin: Annotated[dict, Depends(require_superadmin)]):
-    import httpx
-    try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            resp = await client.post(f"{PERSONALITY_SERVICE_URL}/evolve", json=payload)
-            if resp.status_code != 200:
-                raise HTTPException(status_code=resp.status_code, detail=resp.text)
-            return resp.json()
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Personality Service Error: {e}")
+    # Эволюция — вызов LLM на стороне Personality, поэтому таймаут больше
+    return await _personality_request("POST", "/evolve", payload, timeout=60.0)
 
 @app.post("/admin/personalities/reset")
 async def reset_personality(admin: Annotated[dict, Depends(require_superadmin)]):
-    import httpx
-    try:
-        async with httpx.AsyncClient() as client:
-             resp = await client.post(f"{PERSONALITY_SERVICE_URL}/reset")
-             return resp.json()
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Personality Service Error: {e}")
+    return await _personality_request("POST", "/reset", check_status=False)
 
 @app.get("/admin/personalities/{p_id}/history")
 async def get_personality_history(p_id: str, current_user: Annotated[dict, Depends(get_current_user)]):
-    import httpx
-    try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(f"{PERSONALITY_SERVICE_URL}/personalities/{p_id}/history")
-            if resp.status_code != 200:
-                raise HTTPException(status_code=resp.status_code, detail=resp.text)
-            return resp.json()
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Personality Service Error: {e}")
+    return await _personality_request("GET", f"/personalities/{p_id}/history")
 
 @app.post("/admin/evolution/{p_id}/rollback")
 async def rollback_evolution(p_id: str, payload: dict, admin: Annotated[dict, Depends(require_superadmin)]):
-    import httpx
-    try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(f"{PERSONALITY_SERVICE_URL}/evolution/{p_id}/rollback", json=payload)
-            if resp.status_code != 200:
-                raise HTTPException(status_code=resp.status_code, detail=resp.text)
-            return resp.json()
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Personality Service Error: {e}")
+    return await _personality_request("POST", f"/evolution/{p_id}/rollback", payload)
 
 # --- Monitoring Routes ---
 from src.models import ServiceHealth, SystemError
@@ -325,16 +289,28 @@ async def get_system_errors(
     return result.scalars().all()
 
 # --- Startup ---
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+import asyncio
+from loguru import logger
 from src.monitoring import check_health, start_error_consumer
 from src.log_handler import setup_logger, start_log_handler, stop_log_handler
 
 setup_logger()
 
-scheduler = AsyncIOScheduler()
+health_task = None
+
+
+async def run_health_checks(interval: float = 30.0):
+    """Периодический пинг сервисов без внешнего планировщика."""
+    while True:
+        try:
+            await check_health()
+        except Exception as e:
+            logger.error(f"Health check failed: {e}")
+        await asyncio.sleep(interval)
 
 @app.on_event("startup")
 async def startup():
+    global health_task
     await start_log_handler()
     from src.database import init_db
     from src.events import producer
@@ -344,12 +320,12 @@ async def startup():
     # Start Monitoring
     await start_error_consumer()
     
-    scheduler.add_job(check_health, 'interval', seconds=30)
-    scheduler.start()
+    health_task = asyncio.create_task(run_health_checks())
 
 @app.on_event("shutdown")
 async def shutdown():
     from src.events import producer
     await producer.close()
-    scheduler.shutdown()
+    if health_task:
+        health_task.cancel()
     await stop_log_handler()
@@ -39,7 +39,8 @@ async def check_health():
                 resp = await client.get(svc["url"])
                 if resp.status_code == 200:
                     status = "healthy"
-                    details = json.dumps(resp.json())
+                    # Тело /health уже JSON: сохраняем как есть, без разбора и повторной сериализации
+                    details = resp.text
                 else:
                     status = "unhealthy"
                     details = f"Status: {resp.status_code}"
@@ -90,7 +91,7 @@ async def start_error_consumer():
         
         async def process_message(message: aio_pika.IncomingMessage):
             async with message.process():
-                data = json.loads(message.body.decode())
+                data = json.loads(message.body)
                 await save_error(data)
                 
         await queue.consume(process_message)
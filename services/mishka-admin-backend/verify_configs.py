@@ -1,9 +1,19 @@
 import httpx
 import asyncio
 import os
-from dotenv import load_dotenv
+from pathlib import Path
 
-load_dotenv()
+# .env ищется явно: рядом со скриптом, затем в корне репозитория (один проход,
+# первое найденное) — вместо обхода всех родительских каталогов find_dotenv
+# .env не читается вовсе, если окружение уже задано (docker exec, CI):
+# load_dotenv всё равно не перезаписывает существующие переменные
+BASE_DIR = Path(__file__).resolve().parent
+if "ADMIN_PASSWORD" not in os.environ:
+    dotenv_path = next((p for p in (BASE_DIR / ".env", BASE_DIR.parents[1] / ".env") if p.is_file()), None)
+    if dotenv_path is not None:
+        # dotenv импортируется только когда .env действительно нужно читать
+        from dotenv import load_dotenv
+        load_dotenv(dotenv_path=dotenv_path)
 
 BASE_URL = "http://localhost:8081" # Admin Backend External Port
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "changeme")
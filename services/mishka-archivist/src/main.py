@@ -3,9 +3,8 @@ import os
 import httpx
 import json
 from loguru import logger
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from datetime import datetime
-import pytz
+from string import Template
 
 MEMORY_API_URL = os.getenv("MEMORY_API_URL", "http://mishka-memory:8000")
 LLM_PROVIDER_URL = os.getenv("LLM_PROVIDER_URL", "http://mishka-llm-provider:8000/v1/chat/completions")
@@ -14,27 +13,35 @@ LLM_MODEL = os.getenv("LLM_MODEL", "gemini-1.5-flash")
 from fastapi import FastAPI
 import uvicorn
 from src.log_handler import setup_logger, start_log_handler, stop_log_handler
+from common.scheduler import run_daily
 
 app = FastAPI(title="Mishka Archivist")
-scheduler = AsyncIOScheduler()
+scheduler_task = None
 
 # Initialize Logging
 setup_logger()
 
-async def extract_facts_from_chunk(chunk, user_id):
-    """Sends chunk to LLM to extract facts."""
-    dialog_text = "\n".join([f"{m['role']} ({m.get('created_at','')}): {m['content']}" for m in chunk])
-    
-    prompt = f"""
-    Analyze this dialogue chunk from user {user_id}.
+# Шаблон собирается один раз при импорте; на каждый чанк — только подстановка
+EXTRACT_FACTS_PROMPT = Template("""
+    Analyze this dialogue chunk from user $user_id.
     Extract KEY facts about the user's life, preferences, relationships, or plans.
     Ignore trivial chatter.
     Return a valid JSON list of strings.
     Example: ["User likes sushi", "User has a cat named Luna"]
     
     Dialogue:
-    {dialog_text}
-    """
+    $dialog_text
+    """)
+
+def format_dialog_lines(history) -> list:
+    """Строка диалога на каждое сообщение; форматируется один раз на всю историю."""
+    return [f"{m['role']} ({m.get('created_at','')}): {m['content']}" for m in history]
+
+async def extract_facts_from_chunk(chunk_lines, user_id):
+    """Sends chunk (preformatted dialog lines) to LLM to extract facts."""
+    dialog_text = "\n".join(chunk_lines)
+    
+    prompt = EXTRACT_FACTS_PROMPT.substitute(user_id=user_id, dialog_text=dialog_text)
     
     try:
         async with httpx.AsyncClient(timeout=30.0) as client:
@@ -112,9 +119,11 @@ async def run_archivist_job():
             window = 50
             overlap = 10
             step = window - overlap
+            # Окна перекрываются: форматируем сообщения заранее, окно — срез готовых строк
+            lines = format_dialog_lines(history)
             
-            for i in range(0, len(history), step):
-                chunk = history[i:i+window]
+            for i in range(0, len(lines), step):
+                chunk = lines[i:i+window]
                 if len(chunk) < 5: continue # Skip tiny chunks
                 
                 facts = await extract_facts_from_chunk(chunk, chat_id)
@@ -128,15 +137,16 @@ async def run_archivist_job():
 
 @app.on_event("startup")
 async def startup():
+    global scheduler_task
     await start_log_handler()
     # Schedule at 03:00 AM UTC
-    scheduler.add_job(run_archivist_job, 'cron', hour=3, minute=0)
-    scheduler.start()
+    scheduler_task = asyncio.create_task(run_daily(3, 0, run_archivist_job))
     logger.info("Mishka Archivist started (Schedule: 03:00)")
 
 @app.on_event("shutdown")
 async def shutdown():
-    scheduler.shutdown()
+    if scheduler_task:
+        scheduler_task.cancel()
     await stop_log_handler()
 
 @app.get("/health")
@@ -1,13 +1,12 @@
 import os
-import logging
 import asyncio
 from datetime import datetime
-from aiogram import Bot, Dispatcher, types
+from aiogram import Bot, Dispatcher, F, types
 from aiogram.filters import CommandStart
 from aiogram.types import Message
 from src.rmq import rmq
-
-logger = logging.getLogger(__name__)
+from src.config import ALLOWED_GROUP_ID
+from loguru import logger
 
 # Initialize Bot and Dispatcher
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -17,18 +16,8 @@ if not TOKEN:
 bot = Bot(token=TOKEN) if TOKEN else None
 dp = Dispatcher()
 
-# Security: Allowed Group ID
-ALLOWED_GROUP_ID = os.getenv("ALLOWED_GROUP_ID")
-if not ALLOWED_GROUP_ID:
-    logger.critical("ALLOWED_GROUP_ID is missing in environment variables! Security violation.")
-    raise ValueError("ALLOWED_GROUP_ID is REQUIRED. The bot will not start without a defined allowed group.")
-
-try:
-    ALLOWED_GROUP_ID = int(ALLOWED_GROUP_ID)
-    logger.info(f"Bot restricted to chat_id: {ALLOWED_GROUP_ID}")
-except ValueError:
-    logger.critical(f"Invalid ALLOWED_GROUP_ID format: {ALLOWED_GROUP_ID}")
-    raise ValueError("ALLOWED_GROUP_ID must be an integer.")
+# Security: Allowed Group ID (проверяется в src.config при импорте)
+logger.info("Bot restricted to chat_id: {}", ALLOWED_GROUP_ID)
 
 
 def is_chat_allowed(chat_id: int, user_id: int) -> bool:
@@ -38,6 +27,36 @@ def is_chat_allowed(chat_id: int, user_id: int) -> bool:
     return chat_id == ALLOWED_GROUP_ID
 
 
+# Фильтр на уровне роутера собирается один раз при импорте: апдейты из чужих
+# чатов отсекаются диспетчером до вызова хендлеров. Проверки внутри хендлеров
+# остаются как вторая линия защиты (и для прямых вызовов в тестах).
+dp.message.filter(F.chat.id == ALLOWED_GROUP_ID)
+
+
+async def download_media(file_id: str) -> str:
+    """
+    Скачивает файл Telegram в общий том /media и возвращает локальный путь.
+
+    Файл пишется во временный путь и атомарно переименовывается: LLM-провайдер
+    читает /media из другого контейнера и никогда не увидит недокачанный файл.
+    Раз файл по итоговому пути всегда полный, повторное скачивание не нужно.
+    """
+    file_info = await bot.get_file(file_id)
+    file_ext = file_info.file_path.split('.')[-1]
+    local_path = f"/media/{file_info.file_unique_id}.{file_ext}"
+    if os.path.exists(local_path):
+        return local_path
+    tmp_path = f"{local_path}.tmp"
+    try:
+        await bot.download_file(file_info.file_path, tmp_path)
+        os.replace(tmp_path, local_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return local_path
+
+
 @dp.message(CommandStart())
 async def command_start_handler(message: Message):
     if not is_chat_allowed(message.chat.id, message.from_user.id):
@@ -47,37 +66,32 @@ async def command_start_handler(message: Message):
 
 @dp.message()
 async def message_handler(message: Message):
-    logger.info(f"Received message from {message.from_user.id}")
+    # Поля апдейта читаются один раз в локальные имена: каждое обращение
+    # к атрибуту модели aiogram — это проход по цепочке pydantic-объектов
+    user = message.from_user
+    chat_id = message.chat.id
+    text = message.text
+    logger.info("Received message from {}", user.id)
 
     # Security check
-    if not is_chat_allowed(message.chat.id, message.from_user.id):
+    if not is_chat_allowed(chat_id, user.id):
         return
 
     # Create base event
     event = {
-        "user_id": message.from_user.id,
-        "chat_id": message.chat.id,
-        "username": message.from_user.username,
+        "user_id": user.id,
+        "chat_id": chat_id,
+        "username": user.username,
         "date": message.date.isoformat(),
         "type": "text_message",
-        "text": message.text or message.caption or ""
+        "text": text or message.caption or ""
     }
 
     # Handle Photo
     if message.photo:
         # Get the largest photo
-        photo = message.photo[-1]
-        file_id = photo.file_id
-        file_info = await bot.get_file(file_id)
-        
-        # Determine path in shared volume
-        file_ext = file_info.file_path.split('.')[-1]
-        local_filename = f"{file_info.file_unique_id}.{file_ext}"
-        local_path = f"/media/{local_filename}"
-        
-        # Download file
-        await bot.download_file(file_info.file_path, local_path)
-        logger.info(f"Downloaded photo to {local_path}")
+        local_path = await download_media(message.photo[-1].file_id)
+        logger.info("Downloaded photo to {}", local_path)
         
         event["type"] = "image_message"
         event["file_path"] = local_path
@@ -86,32 +100,25 @@ async def message_handler(message: Message):
     # Handle Voice
     elif message.voice:
         voice = message.voice
-        file_id = voice.file_id
-        file_info = await bot.get_file(file_id)
-        
-        file_ext = file_info.file_path.split('.')[-1]
-        local_filename = f"{file_info.file_unique_id}.{file_ext}"
-        local_path = f"/media/{local_filename}"
-        
-        await bot.download_file(file_info.file_path, local_path)
-        logger.info(f"Downloaded voice to {local_path}")
+        local_path = await download_media(voice.file_id)
+        logger.info("Downloaded voice to {}", local_path)
         
         event["type"] = "voice_message"
         event["file_path"] = local_path
         event["mime_type"] = voice.mime_type or "audio/ogg"
 
     # Skip if no text and no supported media
-    elif not message.text:
+    elif not text:
          return
     
     # Publish to RabbitMQ
     try:
-        logger.info(f"Sending to RabbitMQ: {event}")
-        await start_typing(message.chat.id)
+        logger.info("Sending to RabbitMQ: {}", event)
+        start_typing(chat_id)
         await rmq.publish("chat_events", event)
     except Exception as e:
-        logger.error(f"Failed to publish message: {e}")
-        await stop_typing(message.chat.id) # Stop if failed
+        logger.error("Failed to publish message: {}", e)
+        stop_typing(chat_id) # Stop if failed
         await message.answer("Error processing message.")
 
 
@@ -129,42 +136,44 @@ async def keep_typing(chat_id: int):
     except asyncio.CancelledError:
         pass
     except Exception as e:
-        logger.error(f"Typing status error: {e}")
+        logger.error("Typing status error: {}", e)
     finally:
-        if chat_id in typing_tasks:
+        # Удаляем только свою запись: после stop_typing + start_typing
+        # в словаре может лежать уже новая задача для этого чата
+        if typing_tasks.get(chat_id) is asyncio.current_task():
             del typing_tasks[chat_id]
 
-async def start_typing(chat_id: int):
+# start/stop только планируют и отменяют задачу — ввода-вывода нет, поэтому
+# они синхронные: без лишнего объекта корутины на каждое сообщение
+def start_typing(chat_id: int):
     if chat_id in typing_tasks:
         return # Already typing
     task = asyncio.create_task(keep_typing(chat_id))
     typing_tasks[chat_id] = task
 
-async def stop_typing(chat_id: int):
-    task = typing_tasks.get(chat_id)
+def stop_typing(chat_id: int):
+    task = typing_tasks.pop(chat_id, None)
     if task:
         task.cancel()
-        if chat_id in typing_tasks:
-            del typing_tasks[chat_id]
 
 
 async def send_message_to_user(data: dict):
     """
     Callback for processing messages from bot_outbox queue.
     """
-    logger.info(f"Received response from Brain: {data}")
+    logger.info("Received response from Brain: {}", data)
     chat_id = data.get("chat_id")
     text = data.get("text")
     
     if chat_id:
         # Stop typing when response arrives
-        await stop_typing(chat_id)
+        stop_typing(chat_id)
         
     if chat_id and text:
         try:
             if bot:
                 await bot.send_message(chat_id=chat_id, text=text)
-                logger.info(f"Sent message to {chat_id}: {text}")
+                logger.info("Sent message to {}: {}", chat_id, text)
         except Exception as e:
-            logger.error(f"Failed to send message: {e}")
+            logger.error("Failed to send message: {}", e)
 
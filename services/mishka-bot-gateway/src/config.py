@@ -0,0 +1,48 @@
+"""
+Статические настройки Bot Gateway из переменных окружения.
+Читаются один раз при импорте по единой схеме, как в mishka-brain.
+"""
+import os
+from loguru import logger
+
+# (имя переменной, тип, значение по умолчанию)
+_ENV_SCHEMA = (
+    ("RABBITMQ_DEFAULT_USER", str, "guest"),
+    ("RABBITMQ_DEFAULT_PASS", str, "guest"),
+    ("RABBITMQ_HOST", str, "rabbitmq"),
+    ("RABBITMQ_PORT", int, 5672),
+    # Long polling: сколько секунд Telegram держит getUpdates открытым
+    ("TELEGRAM_POLLING_TIMEOUT", int, 30),
+)
+
+_env = os.environ
+ENV = {name: cast(_env[name]) if name in _env else default for name, cast, default in _ENV_SCHEMA}
+
+RABBITMQ_URL = (
+    f"amqp://{ENV['RABBITMQ_DEFAULT_USER']}:{ENV['RABBITMQ_DEFAULT_PASS']}"
+    f"@{ENV['RABBITMQ_HOST']}:{ENV['RABBITMQ_PORT']}/"
+)
+POLLING_TIMEOUT = ENV["TELEGRAM_POLLING_TIMEOUT"]
+
+# Обязательные переменные (имя, тип): без них шлюз не стартует
+_REQUIRED_ENV = (
+    # Security: бот работает только в одной разрешённой группе
+    ("ALLOWED_GROUP_ID", int),
+)
+
+def _read_required_env() -> dict:
+    values = {}
+    for name, cast in _REQUIRED_ENV:
+        raw = _env.get(name)
+        if not raw:
+            logger.critical("{} is missing in environment variables! Security violation.", name)
+            raise SystemExit(f"{name} is REQUIRED. The bot will not start without it.")
+        try:
+            values[name] = cast(raw)
+        except ValueError:
+            logger.critical("Invalid {} format: {}", name, raw)
+            raise SystemExit(f"{name} must be of type {cast.__name__}.")
+    return values
+
+REQUIRED = _read_required_env()
+ALLOWED_GROUP_ID = REQUIRED["ALLOWED_GROUP_ID"]
@@ -3,15 +3,26 @@ import sys
 from loguru import logger
 from src.bot import dp, bot, send_message_to_user
 from src.rmq import rmq
+from src.config import POLLING_TIMEOUT
 from src.log_handler import setup_logger, start_log_handler, stop_log_handler
 
 # Configure logging
 setup_logger()
 
+try:
+    # uvloop — более быстрый event loop (Linux/Docker); на Windows остаётся asyncio
+    import uvloop
+    run_loop = uvloop.run
+except ImportError:
+    run_loop = asyncio.run
+
 async def main():
     if not bot:
         logger.error("Bot token not configured. Exiting.")
-        return
+        # Ненулевой код, чтобы docker увидел сбой; перед выходом дописываем
+        # очередь логов (файловый sink работает с enqueue=True)
+        await logger.complete()
+        raise SystemExit(1)
 
     # Start Logging
     await start_log_handler()
@@ -25,9 +36,13 @@ async def main():
     
     # Start polling
     bot_info = await bot.get_me()
-    logger.info(f"Starting polling for bot: @{bot_info.username}")
+    logger.info("Starting polling for bot: @{}", bot_info.username)
     try:
-        await dp.start_polling(bot)
+        await dp.start_polling(
+            bot,
+            polling_timeout=POLLING_TIMEOUT,
+            allowed_updates=dp.resolve_used_update_types()
+        )
     finally:
         await rmq.close()
         await bot.session.close()
@@ -35,6 +50,6 @@ async def main():
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        run_loop(main())
     except KeyboardInterrupt:
         logger.info("Bot stopped")
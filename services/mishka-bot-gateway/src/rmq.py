@@ -1,27 +1,21 @@
-import os
 import json
-import logging
 import aio_pika
 import asyncio
-
-logger = logging.getLogger(__name__)
+from loguru import logger
+from src.config import RABBITMQ_URL
 
 class RabbitMQClient:
     def __init__(self):
-        self.user = os.getenv("RABBITMQ_DEFAULT_USER", "guest")
-        self.password = os.getenv("RABBITMQ_DEFAULT_PASS", "guest")
-        self.host = os.getenv("RABBITMQ_HOST", "rabbitmq")
-        self.port = int(os.getenv("RABBITMQ_PORT", 5672))
+        self.url = RABBITMQ_URL
         
         self.connection = None
         self.channel = None
         self.exchange = None
 
     async def connect(self):
-        url = f"amqp://{self.user}:{self.password}@{self.host}:{self.port}/"
         try:
             self.connection = await aio_pika.connect_robust(
-                url, loop=asyncio.get_running_loop()
+                self.url, loop=asyncio.get_running_loop()
             )
             self.channel = await self.connection.channel()
             # Declare queues
@@ -30,7 +24,7 @@ class RabbitMQClient:
             
             logger.info("Connected to RabbitMQ")
         except Exception as e:
-            logger.error(f"Failed to connect to RabbitMQ: {e}")
+            logger.error("Failed to connect to RabbitMQ: {}", e)
             raise
 
     async def publish(self, queue_name: str, message: dict):
@@ -44,7 +38,7 @@ class RabbitMQClient:
             ),
             routing_key=queue_name
         )
-        logger.debug(f"Published to {queue_name}: {message}")
+        logger.debug("Published to {}: {}", queue_name, message)
 
     async def consume(self, queue_name: str, callback):
         if not self.channel:
@@ -54,11 +48,11 @@ class RabbitMQClient:
 
         async def _wrapper(message: aio_pika.IncomingMessage):
             async with message.process():
-                data = json.loads(message.body.decode())
+                data = json.loads(message.body)
                 await callback(data)
 
         await queue.consume(_wrapper)
-        logger.info(f"Started consuming from {queue_name}")
+        logger.info("Started consuming from {}", queue_name)
 
     async def close(self):
         if self.connection:
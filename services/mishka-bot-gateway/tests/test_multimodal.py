@@ -39,7 +39,9 @@ async def test_image_message_handling():
     # Patch dependencies
     with patch("src.bot.bot", mock_bot), \
          patch("src.bot.rmq", mock_rmq), \
-         patch("src.bot.is_chat_allowed", return_value=True):
+         patch("src.bot.is_chat_allowed", return_value=True), \
+         patch("src.bot.os.path.exists", return_value=False), \
+         patch("src.bot.os.replace") as mock_replace:
          
          await message_handler(mock_message)
          
@@ -47,11 +49,12 @@ async def test_image_message_handling():
          # 1. Check get_file called
          mock_bot.get_file.assert_called_with("test_file_id")
          
-         # 2. Check download called with correct path
+         # 2. Check download goes to a temp file, then atomically renamed
          expected_path = "/media/unique_id.jpg"
          mock_bot.download_file.assert_called()
          args = mock_bot.download_file.call_args
-         assert args[0][1] == expected_path
+         assert args[0][1] == expected_path + ".tmp"
+         mock_replace.assert_called_with(expected_path + ".tmp", expected_path)
          
          # 3. Check RMQ publish
          mock_rmq.publish.assert_called()
@@ -0,0 +1,21 @@
+"""
+Статические настройки Brain из переменных окружения.
+Читаются один раз при импорте по единой схеме, а не разрозненными os.getenv в каждом классе.
+"""
+import os
+
+# (имя переменной, тип, значение по умолчанию)
+_ENV_SCHEMA = (
+    ("RABBITMQ_DEFAULT_USER", str, "guest"),
+    ("RABBITMQ_DEFAULT_PASS", str, "guest"),
+    ("RABBITMQ_HOST", str, "rabbitmq"),
+    ("RABBITMQ_PORT", int, 5672),
+)
+
+_env = os.environ
+ENV = {name: cast(_env[name]) if name in _env else default for name, cast, default in _ENV_SCHEMA}
+
+RABBITMQ_URL = (
+    f"amqp://{ENV['RABBITMQ_DEFAULT_USER']}:{ENV['RABBITMQ_DEFAULT_PASS']}"
+    f"@{ENV['RABBITMQ_HOST']}:{ENV['RABBITMQ_PORT']}/"
+)
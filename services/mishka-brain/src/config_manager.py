@@ -3,7 +3,26 @@ import aio_pika
 import json
 import httpx
 import os
+from dataclasses import dataclass
 from loguru import logger
+from src.config import RABBITMQ_URL
+
+
+@dataclass(frozen=True, slots=True)
+class BrainSettings:
+    """Типизированный снимок динамических настроек, используемых на каждом сообщении."""
+    llm_model: str
+    temperature: float
+    rag_fact_limit: int
+    tool_timeout: float
+
+
+def _to_number(cast, value, default):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return default
+
 
 class ConfigManager:
     def __init__(self):
@@ -12,6 +31,7 @@ class ConfigManager:
         # Defaults
         self._configs["system_prompt"] = "Ты дружелюбный бот Мишка. Отвечай кратко и с юмором."
         self._configs["temperature"] = "0.7" # stored as string or whatever DB sends
+        self._rebuild_settings()
 
     async def initialize(self):
         # 1. Load from Admin Backend
@@ -26,6 +46,7 @@ class ConfigManager:
                     if resp.status_code == 200:
                         remote = resp.json()
                         self._configs.update(remote)
+                        self._rebuild_settings()
                         logger.info(f"Loaded dynamic configs: {self._configs}")
                         break
                     else:
@@ -44,14 +65,7 @@ class ConfigManager:
 
     async def _listen_updates(self):
         try:
-            # Construct URL manually as in consumer.py
-            user = os.getenv("RABBITMQ_DEFAULT_USER", "guest")
-            password = os.getenv("RABBITMQ_DEFAULT_PASS", "guest")
-            host = os.getenv("RABBITMQ_HOST", "rabbitmq")
-            port = int(os.getenv("RABBITMQ_PORT", 5672))
-            url = f"amqp://{user}:{password}@{host}:{port}/"
-
-            connection = await aio_pika.connect_robust(url)
+            connection = await aio_pika.connect_robust(RABBITMQ_URL)
             channel = await connection.channel()
             exchange = await channel.declare_exchange("config_events", aio_pika.ExchangeType.FANOUT)
             
@@ -63,11 +77,12 @@ class ConfigManager:
                 async for message in queue_iter:
                     async with message.process():
                         try:
-                            data = json.loads(message.body.decode())
+                            data = json.loads(message.body)
                             if data.get("service") == self.service_name:
                                 key = data["key"]
                                 value = data["value"]
                                 self._configs[key] = value
+                                self._rebuild_settings()
                                 logger.info(f"Dynamic Config Update: {key}={value}")
                         except Exception as e:
                             logger.error(f"Config update error: {e}")
@@ -77,4 +92,17 @@ class ConfigManager:
     def get(self, key: str, default=None):
         return self._configs.get(key, default)
 
+    def _rebuild_settings(self):
+        """
+        Пересобирает self.settings при изменении конфигов.
+        Приведение типов делается один раз здесь, а не на каждом сообщении.
+        """
+        get = self._configs.get
+        self.settings = BrainSettings(
+            llm_model=get("llm_model") or os.getenv("LLM_MODEL", "gemini-pro"),
+            temperature=_to_number(float, get("temperature", 0.7), 0.7),
+            rag_fact_limit=_to_number(int, get("rag_fact_limit", 3), 3),
+            tool_timeout=_to_number(float, get("tool_timeout", 20.0), 20.0),
+        )
+
 config_manager = ConfigManager()
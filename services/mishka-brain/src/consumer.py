@@ -1,25 +1,21 @@
-import os
 import json
 import asyncio
 import aio_pika
 from loguru import logger
+from src.config import RABBITMQ_URL
 from langchain_core.messages import HumanMessage
 from src.graph import graph
 from src.producer import producer
 
 class RabbitMQConsumer:
     def __init__(self):
-        self.user = os.getenv("RABBITMQ_DEFAULT_USER", "guest")
-        self.password = os.getenv("RABBITMQ_DEFAULT_PASS", "guest")
-        self.host = os.getenv("RABBITMQ_HOST", "rabbitmq")
-        self.port = int(os.getenv("RABBITMQ_PORT", 5672))
+        self.url = RABBITMQ_URL
         self.connection = None
         self.channel = None
 
     async def connect(self):
-        url = f"amqp://{self.user}:{self.password}@{self.host}:{self.port}/"
         try:
-            self.connection = await aio_pika.connect_robust(url)
+            self.connection = await aio_pika.connect_robust(self.url)
             self.channel = await self.connection.channel()
             # QoS
             await self.channel.set_qos(prefetch_count=10)
@@ -31,8 +27,8 @@ class RabbitMQConsumer:
     async def process_message(self, message: aio_pika.IncomingMessage):
         async with message.process():
             try:
-                data = json.loads(message.body.decode())
-                logger.info(f"Received event: {data}")
+                data = json.loads(message.body)
+                logger.info("Received event: {}", data)
                 
                 user_id = data.get("user_id")
                 chat_id = data.get("chat_id")
@@ -1,12 +1,16 @@
 import os
+import time
+import datetime
 import httpx
 import json
+from dataclasses import dataclass
+from functools import lru_cache
 from typing import TypedDict, Annotated, List, Union
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
 from loguru import logger
 
-from src.utils import get_context, list_tools
+from src.utils import get_context, list_tools, find_tool, invalidate_tools_cache
 from src.config_manager import config_manager
 
 class AgentState(TypedDict):
@@ -17,13 +21,84 @@ class AgentState(TypedDict):
 
 LLM_PROVIDER_URL = os.getenv("LLM_PROVIDER_URL", "http://mishka-llm-provider:8000/v1/chat/completions")
 MEMORY_API_URL = os.getenv("MEMORY_API_URL", "http://mishka-memory:8000/facts/search")
+PERSONALITY_API_URL = os.getenv("PERSONALITY_API_URL", "http://mishka-personality:8000/current")
 SYSTEM_PROMPT_BASE = "Ты дружелюбный бот Мишка. Отвечай кратко и с юмором."
+PROMPT_CACHE_TTL = 60
+TRACEBACK_LOG_INTERVAL = 60
+_last_traceback_at = float("-inf")
+
+@dataclass(frozen=True, slots=True)
+class PromptCache:
+    """Снимок промпта личности и время его получения (monotonic)."""
+    text: str
+    fetched_at: float
+
+# Снимок подменяется целиком, поэтому читатели никогда не видят текст от одного
+# запроса и время от другого.
+_prompt_cache = PromptCache(SYSTEM_PROMPT_BASE, float("-inf"))
+
+async def get_personality_prompt() -> str:
+    """Возвращает текущий промпт личности, обновляя его не чаще раза в PROMPT_CACHE_TTL секунд."""
+    global _prompt_cache
+    cache = _prompt_cache
+    now = time.monotonic()
+    if now - cache.fetched_at <= PROMPT_CACHE_TTL:
+        return cache.text
+
+    async with httpx.AsyncClient() as client:
+        try:
+            p_resp = await client.get(PERSONALITY_API_URL, timeout=2.0)
+            if p_resp.status_code == 200:
+                data = p_resp.json()
+                cache = _prompt_cache = PromptCache(data.get("text", SYSTEM_PROMPT_BASE), now)
+            else:
+                logger.warning(f"Personality API returned {p_resp.status_code}")
+        except Exception as e:
+            logger.warning(f"Failed to fetch personality: {e}")
+    return cache.text
+
+def parse_tool_call(content):
+    """
+    Разбирает ответ LLM как вызов инструмента: dict с ключом 'tool' или None.
+    Кэш нужен, чтобы should_continue и tool_node не парсили один и тот же JSON дважды.
+    Результат только читается, поэтому общий dict из кэша безопасен.
+    """
+    if not isinstance(content, str):
+        return None
+    return _parse_tool_call(content)
+
+@lru_cache(maxsize=32)
+def _parse_tool_call(content: str):
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return None
+    if isinstance(data, dict) and "tool" in data:
+        return data
+    return None
+
+@lru_cache(maxsize=1024)
+def format_user_content(content: str, user_name: str = None, created_at: str = None) -> str:
+    """
+    Оформляет сообщение пользователя из истории: "[User: имя | Time: ЧЧ:ММ]\nтекст".
+    История между ходами почти не меняется, а agent_node вызывается повторно
+    (после каждого инструмента), поэтому уже оформленные строки берутся из кэша.
+    """
+    name = user_name or "User"
+    time_str = ""
+    if created_at:
+        try:
+            # Try parsing ISO
+            dt = datetime.datetime.fromisoformat(created_at)
+            time_str = f" | Time: {dt.strftime('%H:%M')}"
+        except (TypeError, ValueError):
+            pass
+    return f"[User: {name}{time_str}]\n{content}"
 
 async def retrieve_facts(query: str):
     async with httpx.AsyncClient() as client:
         try:
-            from src.config_manager import config_manager
-            limit = int(config_manager.get("rag_fact_limit", 3))
+            limit = config_manager.settings.rag_fact_limit
             resp = await client.post(MEMORY_API_URL, json={"query": query, "limit": limit}, timeout=5.0)
             if resp.status_code == 200:
                 data = resp.json()
@@ -39,22 +114,29 @@ async def agent_node(state: AgentState):
     # 1. Load Tools (Registry)
     tools = await list_tools()
     
-    # 2. Load Context from Memory (History)
-    history_messages = []
-    context = {}
+    # 2. Load Context from Memory (History) — один проход: сразу форматируем для LLM
+    # и запоминаем исходный текст последней записи для дедупликации текущего хода
+    formatted_history = []
+    last_history_content = None
     if chat_id:
         context = await get_context(chat_id)
         for msg in context.get("history", []):
             role = msg["role"]
             content = msg["content"]
             if role == "user":
-                history_messages.append({"role": "user", "content": content})
+                formatted_history.append({
+                    "role": "user",
+                    "content": format_user_content(content, msg.get("user_name"), msg.get("created_at"))
+                })
+                last_history_content = content
             elif role == "assistant":
-                history_messages.append({"role": "model", "content": content})
+                formatted_history.append({"role": "model", "content": content})
+                last_history_content = content
             elif role == "tool":
-                # We can present tool results as system or model messages depending on LLM
-                # For Gemini, we might want to present it as model/assistant info or system
-                history_messages.append({"role": "user", "content": f"Результат инструмента: {content}"})
+                # Результаты инструментов отдаём Gemini как сообщение пользователя
+                content = f"Результат инструмента: {content}"
+                formatted_history.append({"role": "user", "content": content})
+                last_history_content = content
 
     # 3. Construct System Prompt with Tools
     tools_desc = ""
@@ -62,26 +144,9 @@ async def agent_node(state: AgentState):
         tools_desc = "\n\nТебе доступны инструменты:\n" + json.dumps(tools, ensure_ascii=False, indent=2)
         tools_desc += "\nЕсли нужно вызвать инструмент, верни ТОЛЬКО JSON: {\"tool\": \"name\", \"args\": {...}}"
     
-    import datetime
-
     # 4. Convert currentTurn messages and deduplicate
     current_messages = []
     
-    # helper to format message content
-    def format_content(role, content, user_name=None, created_at=None):
-        if role == "user":
-            name = user_name or "User"
-            time_str = ""
-            if created_at:
-                try:
-                    # Try parsing ISO
-                    dt = datetime.datetime.fromisoformat(created_at)
-                    time_str = f" | Time: {dt.strftime('%H:%M')}"
-                except:
-                    pass
-            return f"[User: {name}{time_str}]\n{content}"
-        return content
-
     for msg in messages:
         if isinstance(msg, HumanMessage):
              # For current turn messages, we might not have metadata in the object itself easily
@@ -98,25 +163,12 @@ async def agent_node(state: AgentState):
              # Let's format history first, that's critical. 
              # Current message is usually implied to be from the active user.
              
-            if history_messages and history_messages[-1]["content"] == msg.content:
+            if last_history_content == msg.content:
                 continue
             current_messages.append({"role": "user", "content": msg.content})
         elif isinstance(msg, AIMessage):
             current_messages.append({"role": "model", "content": msg.content})
 
-    # Re-process history messages to format them
-    formatted_history = []
-    for msg in context.get("history", []):
-         f_role = msg["role"]
-         f_content = msg["content"]
-         if f_role == "user":
-             f_content = format_content("user", f_content, msg.get("user_name"), msg.get("created_at"))
-             formatted_history.append({"role": "user", "content": f_content})
-         elif f_role == "assistant":
-             formatted_history.append({"role": "model", "content": f_content})
-         elif f_role == "tool":
-             formatted_history.append({"role": "user", "content": f"Результат инструмента: {f_content}"})
-
     # Dynamic System Prompt
     current_time_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
     
@@ -131,36 +183,12 @@ async def agent_node(state: AgentState):
     except Exception as e:
         logger.error(f"RAG Error: {e}")
 
-    # CONFIG: System Prompt
-    # PERSONALITY: Fetch Dynamic System Prompt
-    global _cached_prompt, _last_prompt_fetch
-    
-    # Simple Caching Logic (60s)
-    import time
-    if '_cached_prompt' not in globals():
-        _cached_prompt = SYSTEM_PROMPT_BASE
-        _last_prompt_fetch = 0
-        
-    current_time = time.time()
-    if current_time - _last_prompt_fetch > 60:
-        PERSONALITY_API_URL = os.getenv("PERSONALITY_API_URL", "http://mishka-personality:8000/current")
-        async with httpx.AsyncClient() as client:
-            try:
-                p_resp = await client.get(PERSONALITY_API_URL, timeout=2.0)
-                if p_resp.status_code == 200:
-                    data = p_resp.json()
-                    _cached_prompt = data.get("text", SYSTEM_PROMPT_BASE)
-                    _last_prompt_fetch = current_time
-                else:
-                    logger.warning(f"Personality API returned {p_resp.status_code}")
-            except Exception as e:
-                logger.warning(f"Failed to fetch personality: {e}")
+    # PERSONALITY: Dynamic System Prompt (кэш 60с)
+    personality_prompt = await get_personality_prompt()
 
-    system_prompt = f"Current Time: {current_time_str}\n" + _cached_prompt + relevant_facts + tools_desc
+    system_prompt = f"Current Time: {current_time_str}\n" + personality_prompt + relevant_facts + tools_desc
 
-    formatted_messages = [{"role": "system", "content": system_prompt}]
-    formatted_messages.extend(formatted_history)
-    formatted_messages.extend(current_messages)
+    formatted_messages = [{"role": "system", "content": system_prompt}, *formatted_history, *current_messages]
 
     # Attach files to the last message if available and it is a user message
     files = state.get("files", [])
@@ -170,20 +198,20 @@ async def agent_node(state: AgentState):
             last_msg["files"] = files
             logger.info(f"Attaching files to payload: {files}")
 
-    # CONFIG: Temperature
-    try:
-        temp = float(config_manager.get("temperature", 0.7))
-    except:
-        temp = 0.7
-
+    # CONFIG: Model & Temperature (typed snapshot, casts done on config update)
+    settings = config_manager.settings
     payload = {
-        "model": config_manager.get("llm_model", os.getenv("LLM_MODEL", "gemini-pro")),
+        "model": settings.llm_model,
         "messages": formatted_messages,
-        "temperature": temp
+        "temperature": settings.temperature
     }
     
     # LOGGING: Full prompt
-    logger.debug(f"=== SENDING TO LLM ===\n{json.dumps(payload, ensure_ascii=False, indent=2)}\n======================")
+    # lazy: дамп payload строится только если DEBUG реально включён (LOG_LEVEL=DEBUG)
+    logger.opt(lazy=True).debug(
+        "=== SENDING TO LLM ===\n{}\n======================",
+        lambda: json.dumps(payload, ensure_ascii=False, indent=2)
+    )
     
     async with httpx.AsyncClient() as client:
         try:
@@ -197,10 +225,21 @@ async def agent_node(state: AgentState):
             content = data["choices"][0]["message"]["content"]
             
             # LOGGING: LLM Response
-            logger.debug(f"=== LLM RESPONSE ===\n{content}\n====================")
+            logger.debug("=== LLM RESPONSE ===\n{}\n====================", content)
             
             return {"messages": [AIMessage(content=content)], "tools": tools}
             
+        except httpx.HTTPError as e:
+            # Ожидаемые сбои провайдера (429, таймаут, обрыв соединения) под нагрузкой
+            # идут часто: traceback пишем не чаще раза в TRACEBACK_LOG_INTERVAL секунд
+            global _last_traceback_at
+            now = time.monotonic()
+            if now - _last_traceback_at >= TRACEBACK_LOG_INTERVAL:
+                _last_traceback_at = now
+                logger.opt(exception=e).warning("LLM Provider error: {}", e)
+            else:
+                logger.warning("LLM Provider error: {}", e)
+            return {"messages": [AIMessage(content="Ой, ошибка в голове...")]}
         except Exception as e:
             logger.exception(f"LLM Provider error: {e}")
             return {"messages": [AIMessage(content="Ой, ошибка в голове...")]}
@@ -211,13 +250,15 @@ async def tool_node(state: AgentState):
     tools = state.get("tools", [])
     
     try:
-        call = json.loads(last_msg)
+        call = parse_tool_call(last_msg)
         tool_name = call.get("tool")
         args = call.get("args")
         
         # Find tool endpoint
-        tool_config = next((t for t in tools if t["name"] == tool_name), None)
+        tool_config = find_tool(tools, tool_name)
         if not tool_config:
+            # Возможно, список инструментов обновился после кэширования
+            invalidate_tools_cache()
             return {"messages": [HumanMessage(content=f"Ошибка: Инструмент {tool_name} не найден")]}
             
         # LOGGING: Tool Call
@@ -225,8 +266,7 @@ async def tool_node(state: AgentState):
         
         logger.info(f"Calling tool {tool_name} at {tool_config['endpoint']}")
         # Dynamic Tool Timeout
-        from src.config_manager import config_manager
-        tool_to = float(config_manager.get("tool_timeout", 20.0))
+        tool_to = config_manager.settings.tool_timeout
         
         async with httpx.AsyncClient() as client:
             resp = await client.post(tool_config["endpoint"], json=args, timeout=tool_to)
@@ -248,13 +288,9 @@ async def tool_node(state: AgentState):
 def should_continue(state: AgentState):
     """Check if LLM wants to call a tool or talk to user."""
     last_msg = state["messages"][-1].content
-    try:
-        # Simple heuristic: if it's valid JSON with 'tool' key, it's a tool call
-        data = json.loads(last_msg)
-        if isinstance(data, dict) and "tool" in data:
-            return "tools"
-    except:
-        pass
+    # Simple heuristic: if it's valid JSON with 'tool' key, it's a tool call
+    if parse_tool_call(last_msg) is not None:
+        return "tools"
     return "end"
 
 # Build Graph
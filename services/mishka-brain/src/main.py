@@ -1,4 +1,5 @@
 import asyncio
+import signal
 import sys
 from loguru import logger
 from src.consumer import consumer
@@ -8,6 +9,13 @@ from src.log_handler import setup_logger, start_log_handler, stop_log_handler
 # Configure Loguru (Run setup immediately)
 setup_logger()
 
+try:
+    # uvloop — более быстрый event loop (Linux/Docker); на Windows остаётся asyncio
+    import uvloop
+    run_loop = uvloop.run
+except ImportError:
+    run_loop = asyncio.run
+
 async def main():
     logger.info("Starting Mishka Brain...")
     await start_log_handler()
@@ -22,10 +30,18 @@ async def main():
     # Start Consumer
     await consumer.start()
     
-    # Keep running
+    # Keep running until SIGINT/SIGTERM (docker stop)
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Windows: остаётся обработка KeyboardInterrupt
+            pass
+
     try:
-        # Wait forever
-        await asyncio.Future()
+        await stop_event.wait()
     finally:
         logger.info("Shutting down...")
         await consumer.close()
@@ -34,6 +50,6 @@ async def main():
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        run_loop(main())
     except KeyboardInterrupt:
         pass
@@ -1,22 +1,18 @@
-import os
 import json
 import aio_pika
 from loguru import logger
+from src.config import RABBITMQ_URL
 
 class RabbitMQProducer:
     def __init__(self):
-        self.user = os.getenv("RABBITMQ_DEFAULT_USER", "guest")
-        self.password = os.getenv("RABBITMQ_DEFAULT_PASS", "guest")
-        self.host = os.getenv("RABBITMQ_HOST", "rabbitmq")
-        self.port = int(os.getenv("RABBITMQ_PORT", 5672))
+        self.url = RABBITMQ_URL
         
         self.connection = None
         self.channel = None
 
     async def connect(self):
-        url = f"amqp://{self.user}:{self.password}@{self.host}:{self.port}/"
         try:
-            self.connection = await aio_pika.connect_robust(url)
+            self.connection = await aio_pika.connect_robust(self.url)
             self.channel = await self.connection.channel()
             # Declare queue to ensure it exists
             await self.channel.declare_queue("bot_outbox", durable=True)
@@ -1,9 +1,15 @@
 import os
+import time
 import httpx
 from loguru import logger
 
 MEMORY_SERVICE_URL = os.getenv("MEMORY_SERVICE_URL", "http://mishka-memory:8000")
 
+# Последний распарсенный список инструментов и его ETag (инвалидация по версии контента).
+# В пределах TOOLS_CACHE_TTL секунд список отдаётся без запроса в Memory вовсе.
+TOOLS_CACHE_TTL = 60
+_tools_cache = {"etag": None, "tools": [], "by_name": {}, "fetched_at": float("-inf")}
+
 async def save_message(chat_id: int, role: str, content: str, user_name: str = None, created_at: str = None):
     """Save message to Memory Service."""
     if not content:
@@ -35,12 +41,37 @@ async def get_context(chat_id: int) -> dict:
             return {"history": [], "user": None}
 
 async def list_tools() -> list:
-    """Fetch available tools from Memory Service."""
+    """
+    Fetch available tools from Memory Service.
+    Условный GET: пока ETag не изменился, Memory отвечает 304 и берётся уже распарсенный список.
+    """
+    if time.monotonic() - _tools_cache["fetched_at"] < TOOLS_CACHE_TTL:
+        return _tools_cache["tools"]
+
     async with httpx.AsyncClient() as client:
         try:
-            resp = await client.get(f"{MEMORY_SERVICE_URL}/tools/config")
+            headers = {"If-None-Match": _tools_cache["etag"]} if _tools_cache["etag"] else {}
+            resp = await client.get(f"{MEMORY_SERVICE_URL}/tools/config", headers=headers)
+            if resp.status_code == 304:
+                _tools_cache["fetched_at"] = time.monotonic()
+                return _tools_cache["tools"]
             resp.raise_for_status()
-            return resp.json()
+            tools = resp.json()
+            _tools_cache["etag"] = resp.headers.get("etag")
+            _tools_cache["tools"] = tools
+            _tools_cache["by_name"] = {t["name"]: t for t in tools}
+            _tools_cache["fetched_at"] = time.monotonic()
+            return tools
         except Exception as e:
             logger.error(f"Failed to list tools: {e}")
             return []
+
+def find_tool(tools: list, name: str):
+    """Конфиг инструмента по имени: для списка из кэша — O(1) по готовому индексу."""
+    if tools is _tools_cache["tools"]:
+        return _tools_cache["by_name"].get(name)
+    return next((t for t in tools if t["name"] == name), None)
+
+def invalidate_tools_cache():
+    """Сбрасывает TTL: следующий list_tools перепроверит список в Memory (ETag сохраняется)."""
+    _tools_cache["fetched_at"] = float("-inf")
@@ -2,39 +2,41 @@ import asyncio
 import os
 import httpx
 import json
-import numpy as np
 from loguru import logger
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from datetime import datetime
+from string import Template
 
 MEMORY_API_URL = os.getenv("MEMORY_API_URL", "http://mishka-memory:8000")
 LLM_PROVIDER_URL = os.getenv("LLM_PROVIDER_URL", "http://mishka-llm-provider:8000/v1/chat/completions")
 LLM_MODEL = os.getenv("LLM_MODEL", "gemini-1.5-flash")
+# Сколько фактов максимум кластеризуется за ночь и размер страницы запроса к memory
+FACTS_LIMIT = 2000
+FACTS_PAGE_SIZE = 500
 
 from fastapi import FastAPI
 import uvicorn
 from src.log_handler import setup_logger, start_log_handler, stop_log_handler
+from common.scheduler import run_daily
 
 app = FastAPI(title="Mishka Dreamer")
-scheduler = AsyncIOScheduler()
+scheduler_task = None
 
 setup_logger()
 
-def cosine_similarity(v1, v2):
-    return np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
-
-async def merge_cluster(cluster_facts):
-    """Asks LLM to merge facts."""
-    texts = [f["text"] for f in cluster_facts]
-    prompt = f"""
+# Шаблон собирается один раз при импорте; на каждый кластер — только подстановка
+MERGE_FACTS_PROMPT = Template("""
     Consolidate these related facts into a single, concise fact.
     Retain all key details (names, dates, preferences) but remove redundancy.
     
     Facts:
-    {json.dumps(texts, indent=2, ensure_ascii=False)}
+    $facts
     
     Return pure text of the merged fact.
-    """
+    """)
+
+async def merge_cluster(cluster_facts):
+    """Asks LLM to merge facts."""
+    texts = [f["text"] for f in cluster_facts]
+    prompt = MERGE_FACTS_PROMPT.substitute(facts=json.dumps(texts, indent=2, ensure_ascii=False))
     
     try:
         async with httpx.AsyncClient(timeout=30.0) as client:
@@ -52,17 +54,27 @@ async def merge_cluster(cluster_facts):
         return None
 
 async def run_dreamer_job():
+    # numpy нужен только ночной задаче: не держим его в памяти с момента старта
+    import numpy as np
+
     logger.info("Starting Nightly Dream (Consolidation)...")
     
     try:
-        # 1. Fetch All Facts
+        # 1. Fetch All Facts — постранично: ни один ответ memory не тащит все векторы разом
+        facts = []
         async with httpx.AsyncClient() as client:
             try:
-                resp = await client.get(f"{MEMORY_API_URL}/facts/all", params={"limit": 2000}, timeout=10.0)
-                if resp.status_code != 200:
-                    logger.error("Failed to fetch facts")
-                    return
-                facts = resp.json()
+                params = {"limit": FACTS_PAGE_SIZE}
+                while len(facts) < FACTS_LIMIT:
+                    resp = await client.get(f"{MEMORY_API_URL}/facts/all", params=params, timeout=10.0)
+                    if resp.status_code != 200:
+                        logger.error("Failed to fetch facts")
+                        return
+                    facts.extend(resp.json())
+                    next_offset = resp.headers.get("X-Next-Offset")
+                    if not next_offset:
+                        break
+                    params["offset"] = next_offset
             except Exception as e:
                 logger.error(f"Fetch facts failed: {e}")
                 return
@@ -73,42 +85,43 @@ async def run_dreamer_job():
         # 2. Greedy Clustering (Sim > 0.85)
         # Using numpy for speed
         try:
-            vectors = np.array([f["vector"] for f in facts])
-            # ... (Existing logic kept implicitly, I should paste it) ...
-            # Wait, I need to copy the logic.
-            
-            # Reusing existing logic
-            ids = [f["id"] for f in facts]
+            # float32: эмбеддинги и так одинарной точности, матрица вдвое меньше float64
+            vectors = np.asarray([f["vector"] for f in facts], dtype=np.float32)
+            # Нормы считаются один раз на матрицу (SoA: одна строка — один факт).
+            # Нулевой вектор дал бы NaN во всей строке сходств: делим на 1, строка
+            # остаётся нулевой и ни с чем не кластеризуется. Нормируем на месте.
             norms = np.linalg.norm(vectors, axis=1, keepdims=True)
-            normalized = vectors / norms
+            norms[norms == 0] = 1.0
+            vectors /= norms
             
-            active_indices = set(range(len(facts)))
+            # Все попарные сходства одним матричным умножением (BLAS) вместо
+            # отдельного прохода по матрице на каждый факт; дальше — только маски
+            close = (vectors @ vectors.T) > 0.85
+            np.fill_diagonal(close, True)
+            active = np.ones(len(facts), dtype=bool)
             clusters = []
             
-            while active_indices:
-                idx = active_indices.pop()
-                current_cluster = [idx]
-                sims = np.dot(normalized, normalized[idx])
-                candidates = np.where(sims > 0.85)[0]
-                for c_idx in candidates:
-                    if c_idx in active_indices and c_idx != idx:
-                        current_cluster.append(c_idx)
-                        active_indices.remove(c_idx)
+            for idx in range(len(facts)):
+                if not active[idx]:
+                    continue
+                current_cluster = np.flatnonzero(close[idx] & active)
+                active[current_cluster] = False
                 
                 if len(current_cluster) > 1:
                     clusters.append([facts[i] for i in current_cluster])
 
             logger.info(f"Found {len(clusters)} clusters to merge.")
             
-            # 3. Merge Clusters
-            for cluster in clusters:
-                merged_text = await merge_cluster(cluster)
-                if merged_text:
-                    logger.info(f"Merged {len(cluster)} facts into: {merged_text}")
-                    for f in cluster:
-                        async with httpx.AsyncClient() as client:
-                            await client.delete(f"{MEMORY_API_URL}/facts/{f['id']}")
-                    async with httpx.AsyncClient() as client:
+            # 3. Merge Clusters — один клиент на проход, кластер удаляется одним запросом
+            async with httpx.AsyncClient() as client:
+                for cluster in clusters:
+                    merged_text = await merge_cluster(cluster)
+                    if merged_text:
+                        logger.info(f"Merged {len(cluster)} facts into: {merged_text}")
+                        await client.post(
+                            f"{MEMORY_API_URL}/facts/delete",
+                            json={"ids": [str(f["id"]) for f in cluster]}
+                        )
                         await client.post(
                             f"{MEMORY_API_URL}/facts/add",
                             json={
@@ -126,14 +139,15 @@ async def run_dreamer_job():
 
 @app.on_event("startup")
 async def startup():
+    global scheduler_task
     await start_log_handler()
-    scheduler.add_job(run_dreamer_job, 'cron', hour=4, minute=0)
-    scheduler.start()
+    scheduler_task = asyncio.create_task(run_daily(4, 0, run_dreamer_job))
     logger.info("Mishka Dreamer started (Schedule: 04:00)")
 
 @app.on_event("shutdown")
 async def shutdown():
-    scheduler.shutdown()
+    if scheduler_task:
+        scheduler_task.cancel()
     await stop_log_handler()
 
 @app.get("/health")
@@ -2,9 +2,24 @@ import asyncio
 import aio_pika
 import json
 import httpx
+from functools import lru_cache
+from typing import Tuple
 from loguru import logger
 from src.config import settings
 
+@lru_cache(maxsize=16)
+def _parse_csv(raw: str) -> Tuple[str, ...]:
+    """
+    Разбирает CSV-значение конфига. Кэшируется по самой строке: значение
+    меняется только через config_events, а читается на каждое сообщение.
+    """
+    return tuple(x for x in map(str.strip, raw.split(",")) if x)
+
+@lru_cache(maxsize=16)
+def _parse_int(raw) -> int:
+    """Числовое значение конфига (из админки приходят строки); кэш по самому значению."""
+    return int(raw)
+
 class ConfigManager:
     def __init__(self):
         self._configs = {}
@@ -56,7 +71,7 @@ class ConfigManager:
                 async for message in queue_iter:
                     async with message.process():
                         try:
-                            data = json.loads(message.body.decode())
+                            data = json.loads(message.body)
                             # Check if targeted for us OR global (if we support global keys)
                             # For now, data has "service" field.
                             if data.get("service") == self.service_name:
@@ -72,10 +87,16 @@ class ConfigManager:
     def get(self, key: str, default=None):
         return self._configs.get(key, default)
 
+    def get_int(self, key: str, default: int) -> int:
+        val = self._configs.get(key)
+        if val is None:
+            return default
+        return val if type(val) is int else _parse_int(val)
+
     def get_list(self, key: str, default=None) -> list:
         val = self.get(key, default)
         if isinstance(val, str):
-            return [x.strip() for x in val.split(",") if x.strip()]
+            return list(_parse_csv(val))
         return val if isinstance(val, list) else []
 
 config_manager = ConfigManager()
@@ -1,4 +1,5 @@
 import asyncio
+import signal
 import aio_pika
 import json
 from loguru import logger
@@ -9,8 +10,7 @@ from src.producer import send_to_brain
 async def process_message(message: aio_pika.IncomingMessage):
     async with message.process():
         try:
-            body = message.body.decode()
-            data = json.loads(body)
+            data = json.loads(message.body)
             # data structure depends on Gateway. Assuming it sends raw Update or Message dict.
             # Looking at Gateway: it sends {"chat_id": ..., "text": ..., "raw": update_dict} usually.
             # Correct logic: We need the full message object for rules.
@@ -49,8 +49,18 @@ async def start_consumer():
     
     logger.info("Initiative Service: Listening to chat_events...")
     await queue.consume(process_message)
-    
+
+    # Работаем до SIGINT/SIGTERM (docker stop), затем закрываем соединение
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Windows: остаётся обработка KeyboardInterrupt
+            pass
+
     try:
-        await asyncio.Future()
+        await stop_event.wait()
     finally:
         await connection.close()
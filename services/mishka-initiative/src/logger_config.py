@@ -14,7 +14,8 @@ def setup_logger():
         rotation="10 MB",
         level="INFO", # Initiative logs contain INFO mostly
         mode="a", # Append mode (Brain uses 'w'? Let's check)
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}"
+        format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}",
+        enqueue=True
     )
     
     logger.info("Initiative logging initialized.")
@@ -4,6 +4,13 @@ from src.consumer import start_consumer
 from src.logger_config import setup_logger
 from src.config_manager import config_manager
 
+try:
+    # uvloop — более быстрый event loop (Linux/Docker); на Windows остаётся asyncio
+    import uvloop
+    run_loop = uvloop.run
+except ImportError:
+    run_loop = asyncio.run
+
 async def init_app():
     await config_manager.initialize()
     await start_consumer()
@@ -14,6 +21,6 @@ if __name__ == "__main__":
     
     try:
         # Run init in loop
-        asyncio.run(init_app())
+        run_loop(init_app())
     except KeyboardInterrupt:
         logger.info("Stopping...")
@@ -1,5 +1,8 @@
 import httpx
 import json
+from functools import lru_cache
+from pathlib import Path
+from string import Template
 from loguru import logger
 from src.config import settings
 
@@ -36,6 +39,19 @@ async def check_hard_rules(message: dict) -> bool:
 
 from src.config_manager import config_manager
 
+# Тексты промптов лежат в src/prompts/*.txt и читаются при первом обращении
+PROMPTS_DIR = Path(__file__).parent / "prompts"
+
+@lru_cache(maxsize=None)
+def load_prompt(name: str) -> str:
+    """Текст промпта src/prompts/<name>.txt (кэшируется на время жизни процесса)."""
+    return (PROMPTS_DIR / f"{name}.txt").read_text(encoding="utf-8")
+
+@lru_cache(maxsize=None)
+def get_soft_rule_template() -> Template:
+    # string.Template: фигурные скобки JSON в тексте не требуют экранирования
+    return Template(load_prompt("soft_rule_prompt"))
+
 async def check_soft_rules(message: dict) -> bool:
     """
     Uses LLM to judge relevance using Dynamic Configs.
@@ -69,79 +85,26 @@ async def check_soft_rules(message: dict) -> bool:
         aliases = config_manager.get_list("aliases", ["Миш", "Мишка", "Bear", "Потапыч"])
         aliases_str = ", ".join(aliases)
         
-        # LLM Judge
-        DEFAULT_PROMPT = f"""
-        You are an AI assistant named 'Mishka' (Мишка).
-        Your aliases: {aliases_str}.
-        
-        Decide if you should reply to the last message in a Group Chat.
-        
-        Context:
-        {context_str}
-        
-        Last Message: "{text}"
-        
-        Criteria:
-        - Reply IMMEDIATELY (Score 100) if the user addresses you by Name or Alias (e.g. "Миш, ты тут?", "Mishka help").
-        - Reply (Score 80+) if the user asks a question relevant to you or general knowledge.
-        - Reply (Score 75+) if the user is venting/emotional and a supportive comment fits the persona.
-        - Ignore (Score < 50) short, irrelevant, or phatic expressions (e.g. "ok", "lol") unless they address you.
-        - Ignore (Score < 30) internal discussions between other people if not relevant to you.
-        
-        Return JSON: {{"score": 0-100, "reason": "why"}}
-        """
-
-        prompt = config_manager.get("soft_rule_prompt", DEFAULT_PROMPT)
-        
-        # Format aliases/context if the dynamic prompt has placeholders (Advanced usage)
-        # For now, we assume if user changes prompt, they hardcode what they need or we stick to current interpolation.
-        # But wait, python f-string happens BEFORE config_manager.get? No.
-        # If I use DEFAULT_PROMPT as f-string, it is fully formed string. 
-        # If user provides a string via config, it won't have context variables injected unless we use .format().
-        # Let's support basic .format() if braces are present.
-        
-        # Actually, to be safe and simple:
-        # We will NOT support dynamic context injection in the OVERRIDE for now unless we structure it carefully.
-        # But the requirement is to use dynamic prompt.
-        # If I just fetch string, it's static.
-        # Correct approach: fetch TEMPLATE from config, then format.
-        
-        # Only if we want to allow user to change the Logic Template.
-        # Let's assume the user just wants to tweak the instructions.
-        
-        # Improving implementation:
-        base_instructions = config_manager.get("soft_rule_instructions", 
-        """
-        Criteria:
-        - Reply IMMEDIATELY (Score 100) if the user addresses you by Name or Alias (e.g. "Миш, ты тут?", "Mishka help").
-        - Reply (Score 80+) if the user asks a question relevant to you or general knowledge.
-        - Reply (Score 75+) if the user is venting/emotional and a supportive comment fits the persona.
-        - Ignore (Score < 50) short, irrelevant, or phatic expressions (e.g. "ok", "lol") unless they address you.
-        - Ignore (Score < 30) internal discussions between other people if not relevant to you.
-        """)
-
-        prompt = f"""
-        You are an AI assistant named 'Mishka' (Мишка).
-        Your aliases: {aliases_str}.
-        
-        Decide if you should reply to the last message in a Group Chat.
-        
-        Context:
-        {context_str}
-        
-        Last Message: "{text}"
-        
-        {base_instructions}
-        
-        Return JSON: {{"score": 0-100, "reason": "why"}}
-        """
+        # LLM Judge: шаблон и инструкции по умолчанию читаются из файлов один раз,
+        # на каждое сообщение остаётся одна подстановка
+        base_instructions = config_manager.get("soft_rule_instructions")
+        if base_instructions is None:
+            base_instructions = load_prompt("soft_rule_instructions")
+        prompt = get_soft_rule_template().substitute(
+            aliases=aliases_str,
+            context=context_str,
+            text=text,
+            instructions=base_instructions
+        )
 
         llm_model = config_manager.get("llm_model", settings.LLM_MODEL)
         
         payload = {
             "model": llm_model, 
             "messages": [{"role": "user", "content": prompt}],
-            "response_format": {"type": "json_object"}
+            "response_format": {"type": "json_object"},
+            # Оценка детерминирована для одного и того же контекста — кэшируем надолго
+            "cache_ttl": 300
         }
         
         async with httpx.AsyncClient() as client:
@@ -157,7 +120,7 @@ async def check_soft_rules(message: dict) -> bool:
                 reason = result.get("reason", "no reason")
                 
                 # Dynamic Threshold
-                threshold = int(config_manager.get("threshold", settings.INITIATIVE_THRESHOLD))
+                threshold = config_manager.get_int("threshold", settings.INITIATIVE_THRESHOLD)
                 
                 logger.info(f"Soft Rule Judge: Score {score}, Threshold {threshold}, Reason: {reason}")
                 return score >= threshold
@@ -21,3 +21,7 @@ def get_proxy_url():
     return proxy
 
 LLM_PROXY = get_proxy_url()
+
+# Размер пула потоков event loop (asyncio.to_thread: чтение файлов перед загрузкой).
+# Подбирается под число одновременных запросов к Gemini, а не под число CPU.
+THREAD_POOL_SIZE = int(os.getenv("MISHKA_THREAD_POOL_SIZE", "16"))
@@ -1,6 +1,7 @@
 
 import asyncio
 import os
+import sys
 import aio_pika
 import httpx
 import json
@@ -12,7 +13,10 @@ class ConfigManager:
         self.service_name = "mishka-llm-provider"
         # Defaults
         self._configs["default_model"] = "gemini-2.0-flash"
-        self._configs["request_timeout"] = "120.0"
+        # Числовые умолчания хранятся уже как float: get_float отдаёт их без приведения
+        self._configs["request_timeout"] = 120.0
+        self._configs["response_cache_ttl"] = 10.0
+        self._configs["key_wait_max"] = 5.0
 
     async def initialize(self):
         """Fetch initial configs and start listening."""
@@ -22,6 +26,16 @@ class ConfigManager:
     def get(self, key: str, default=None):
         return self._configs.get(key, default)
 
+    def get_float(self, key: str, default: float) -> float:
+        """
+        Значение конфига как float. Приведение нужно только строкам из админки;
+        умолчания и уже числовые значения возвращаются как есть.
+        """
+        val = self._configs.get(key)
+        if val is None:
+            return default
+        return val if type(val) is float else float(val)
+
     async def _fetch_initial_configs(self):
         admin_url = "http://mishka-admin-backend:8080"
         
@@ -55,7 +69,9 @@ class ConfigManager:
                         # Oh wait, verify_configs.py logic?
                         # No, let's just use .update(resp.json()) like others if format is dict.
                         
-                        self._configs.update(data)
+                        # Ключи интернируются: get() на каждом запросе ищет их литералами,
+                        # и совпадение находится по указателю без сравнения строк
+                        self._configs.update({sys.intern(k): v for k, v in data.items()})
                         logger.info(f"Loaded dynamic configs: {self._configs}")
                         break
                     else:
@@ -89,11 +105,11 @@ class ConfigManager:
                         async for message in queue_iter:
                             async with message.process():
                                 try:
-                                    payload = json.loads(message.body.decode())
+                                    payload = json.loads(message.body)
                                     if payload.get("service") == self.service_name:
                                         key = payload.get("key")
                                         value = payload.get("value")
-                                        self._configs[key] = value
+                                        self._configs[sys.intern(key)] = value
                                         logger.info(f"Dynamic Config Update: {key}={value}")
                                 except Exception as e:
                                     logger.error(f"Error processing update: {e}")
@@ -1,35 +1,148 @@
+import heapq
 import os
 import time
-from itertools import cycle
 from typing import List
+from loguru import logger
+
+
+def _next_midnight() -> float:
+    """Возвращает timestamp ближайшей локальной полуночи (момент сброса суточных счётчиков)."""
+    now = time.localtime()
+    return time.mktime((now.tm_year, now.tm_mon, now.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+
 
 class KeyManager:
     def __init__(self):
         self.keys = []
         self._load_keys()
-        self._iterator = cycle(self.keys) if self.keys else None
+        self._index = {key: idx for idx, key in enumerate(self.keys)}
+        # monotonic-момент, до которого ключ пропускается (после 429 с Retry-After)
+        self._cooldown_until = [0.0] * len(self.keys)
+        # Суточный лимит запросов на один ключ (free tier Gemini ~1500 RPD)
+        self.daily_limit = int(os.getenv("GEMINI_KEY_DAILY_LIMIT", "1500"))
+        # Token bucket на ключ: не больше rpm запросов в минуту (0 — выключен).
+        # Запрос сверх лимита не уходит в Gemini ради заведомого 429.
+        self.rpm = int(os.getenv("GEMINI_KEY_RPM", "0"))
+        self._tokens = [float(self.rpm)] * len(self.keys)
+        self._refilled_at = [time.monotonic()] * len(self.keys)
+        # Блокировки нет намеренно: менеджер вызывается только из корутин FastAPI,
+        # то есть из одного потока event loop, и операции с кучей не перемежаются.
+        self.reset_daily_counts()
 
     def _load_keys(self):
         # Try new plural env var first
         keys_str = os.getenv("GOOGLE_API_KEYS") or os.getenv("GEMINI_API_KEYS")
         if keys_str:
-            self.keys = [k.strip() for k in keys_str.split(",") if k.strip()]
-        
+            self.keys = [k for k in map(str.strip, keys_str.split(",")) if k]
+
         # Fallback to singular
         if not self.keys:
             single = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
             if single:
                 self.keys = [single]
-        
-        print(f"Loaded {len(self.keys)} API Keys.")
+
+    def reset_daily_counts(self):
+        """Обнуляет суточные счётчики и пересобирает кучу."""
+        # Счётчики по позиции ключа + min-heap из изменяемых записей [count, idx].
+        # Список [[0, 0], [0, 1], ...] уже является корректной кучей.
+        # Новые структуры собираются отдельно и подменяются целиком: снимок,
+        # взятый get_stats, никогда не видит наполовину сброшенное состояние.
+        counts = [0] * len(self.keys)
+        heap = [[0, idx] for idx in range(len(self.keys))]
+        self.usage_counts, self._heap = counts, heap
+        self._reset_at = _next_midnight()
+        self._exhausted_warned = False
 
     def get_next_key(self) -> str:
-        """Returns the next key in rotation strategy (Round Robin)."""
+        """
+        Возвращает наименее использованный за сутки ключ.
+
+        Вершина кучи — ключ с минимальным счётчиком, поэтому выбор стоит O(log N)
+        вместо перебора всех ключей. При равных счётчиках ключи идут по кругу.
+        Если исчерпаны все ключи, всё равно отдаём ключ — Gemini ответит 429,
+        и запрос уйдёт в штатную обработку rate limit.
+        """
+        return self.reserve(1)
+
+    def reserve(self, n: int = 1) -> str:
+        """
+        Выдаёт наименее использованный ключ и сразу списывает на него n запросов.
+
+        Нужно, когда один запрос клиента делает несколько вызовов API одним ключом
+        (загрузка файлов + генерация): одна операция с кучей вместо n.
+        """
         if not self.keys:
             return None
-        return next(self._iterator)
+        if time.time() >= self._reset_at:
+            self.reset_daily_counts()
+
+        # Недоступные ключи (пауза после 429, пустой bucket) временно снимаются
+        # с вершины кучи. Если недоступны все, берём наименее использованный.
+        heap = self._heap
+        blocked = []
+        if self.rpm or self._cooldown_until[heap[0][1]]:
+            now = time.monotonic()
+            while heap and self._wait_for(heap[0][1], n, now) > 0:
+                blocked.append(heapq.heappop(heap))
+            if not heap:
+                heap.append(blocked.pop(0))
+
+        entry = heap[0]
+        count, idx = entry
+        entry[0] = count + n
+        self.usage_counts[idx] = count + n
+        heapq.heapreplace(heap, entry)
+        for item in blocked:
+            heapq.heappush(heap, item)
+        if self.rpm:
+            self._tokens[idx] -= n
+
+        if count >= self.daily_limit and not self._exhausted_warned:
+            self._exhausted_warned = True
+            logger.warning("All {} API keys reached daily limit ({}).", len(self.keys), self.daily_limit)
+        return self.keys[idx]
+
+    def _wait_for(self, idx: int, n: int, now: float) -> float:
+        """Сколько секунд ключ ещё недоступен для n запросов (0 — доступен сейчас)."""
+        wait = self._cooldown_until[idx] - now
+        if self.rpm:
+            tokens = min(self.rpm, self._tokens[idx] + (now - self._refilled_at[idx]) * self.rpm / 60)
+            self._tokens[idx], self._refilled_at[idx] = tokens, now
+            # Запрос больше ёмкости bucket ждёт полного bucket, иначе не прошёл бы никогда
+            missing = min(n, self.rpm) - tokens
+            if missing > 0:
+                wait = max(wait, missing * 60 / self.rpm)
+        return max(wait, 0.0)
+
+    def throttle_delay(self, n: int = 1) -> float:
+        """Через сколько секунд хотя бы один ключ сможет принять n запросов (0 — сейчас)."""
+        if not self.keys:
+            return 0.0
+        now = time.monotonic()
+        return min(self._wait_for(idx, n, now) for idx in range(len(self.keys)))
+
+    def mark_rate_limited(self, key: str, retry_after: float):
+        """Снимает ключ с ротации на retry_after секунд (подсказка из ответа 429)."""
+        idx = self._index.get(key)
+        if idx is not None and retry_after > 0:
+            self._cooldown_until[idx] = time.monotonic() + retry_after
 
     def get_all_keys(self) -> List[str]:
         return self.keys
 
+    def get_stats(self) -> dict:
+        """
+        Снимок суточного использования ключей. usage — счётчики по индексу ключа
+        в GOOGLE_API_KEYS: без фрагментов ключей (отдаётся в открытом /health).
+        """
+        counts = list(self.usage_counts)
+        now = time.monotonic()
+        return {
+            "daily_limit": self.daily_limit,
+            "reset_at": self._reset_at,
+            "cooling_down": sum(1 for until in self._cooldown_until if until > now),
+            "rpm": self.rpm,
+            "usage": counts
+        }
+
 key_manager = KeyManager()
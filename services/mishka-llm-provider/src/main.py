@@ -1,14 +1,20 @@
 """
 Mishka LLM Provider - использует прямые REST вызовы к Gemini API с явной настройкой прокси.
 """
+import asyncio
+import concurrent.futures
+import math
 import os
 import httpx
-import google.generativeai as genai
+import orjson
+from pathlib import Path
+from loguru import logger
 from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
 from typing import List, Optional
-from src.config import LLM_PROXY
+from src.config import LLM_PROXY, THREAD_POOL_SIZE
 from src.key_manager import key_manager
+from src.response_cache import response_cache
 
 app = FastAPI(title="Mishka LLM Provider")
 
@@ -19,25 +25,97 @@ setup_logger()
 
 @app.on_event("startup")
 async def startup_event():
+    # Заменяет default executor цикла глобально: все asyncio.to_thread в процессе
+    asyncio.get_running_loop().set_default_executor(
+        concurrent.futures.ThreadPoolExecutor(max_workers=THREAD_POOL_SIZE)
+    )
     await start_log_handler()
     await config_manager.initialize()
+    get_http_client()
+    # Одна сводная строка вместо разрозненных print при импорте модулей
+    logger.log(
+        "INFO" if LLM_PROXY else "WARNING",
+        "LLM Provider started: {} API keys (daily limit {}), proxy: {}",
+        len(key_manager.keys), key_manager.daily_limit, LLM_PROXY or "NOT CONFIGURED"
+    )
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    if _http_client is not None:
+        await _http_client.aclose()
     await stop_log_handler()
 
 # Gemini API Configuration
 GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models"
+GEMINI_UPLOAD_URL = "https://generativelanguage.googleapis.com/upload/v1beta/files"
+
+RETRY_INFO_TYPE = "type.googleapis.com/google.rpc.RetryInfo"
+JSON_HEADERS = {"Content-Type": "application/json"}
+# Сбои транспорта, после которых есть смысл повторить запрос другим ключом.
+# Порядок — по частоте: таймауты через прокси случаются чаще обрывов соединения.
+_RETRYABLE = (httpx.TimeoutException, httpx.NetworkError, httpx.ProxyError, httpx.RemoteProtocolError)
+
+
+def parse_retry_after(response: httpx.Response) -> Optional[float]:
+    """
+    Сколько секунд сервер просит подождать после 429: заголовок Retry-After
+    или google.rpc.RetryInfo.retryDelay ("37s") в теле ошибки Gemini.
+    """
+    header = response.headers.get("retry-after")
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            pass
+    try:
+        details = orjson.loads(response.content).get("error", {}).get("details", [])
+        for detail in details:
+            if detail.get("@type") == RETRY_INFO_TYPE:
+                return float(detail.get("retryDelay", "").rstrip("s"))
+    except (orjson.JSONDecodeError, AttributeError, ValueError):
+        pass
+    return None
+
+# Причина пустого ответа Gemini -> (уровень лога, текст ошибки для клиента).
+# None вместо текста: ответ отдаётся клиенту как есть (пустая строка).
+EMPTY_RESPONSES = {
+    "blocked": ("WARNING", "Prompt blocked by Gemini safety filters"),
+    "no_candidates": ("WARNING", "No response from Gemini (Safety?)"),
+    "empty_text": ("INFO", None),
+}
+
+
+def classify_empty_response(data: dict, text: str) -> Optional[str]:
+    """Ключ EMPTY_RESPONSES для пустого ответа Gemini или None, если текст есть."""
+    if text:
+        return None
+    if data.get("promptFeedback", {}).get("blockReason"):
+        return "blocked"
+    if not data.get("candidates"):
+        return "no_candidates"
+    return "empty_text"
 
 # Proxy Configuration
 PROXY_CONFIG = None
 if LLM_PROXY:
-    print(f"Using Proxy: {LLM_PROXY}")
-    # Configure genai to use proxy implicitly via env vars (it respects them)
+    # Для SDK-скриптов (check_models.py): httpx-клиент получает прокси явно
     os.environ["HTTP_PROXY"] = LLM_PROXY
     os.environ["HTTPS_PROXY"] = LLM_PROXY
-else:
-    print("WARNING: No proxy configured!")
+
+# Один AsyncClient на процесс: пул keep-alive соединений вместо нового
+# TCP/TLS-рукопожатия (через прокси) на каждую попытку запроса.
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Возвращает общий HTTP-клиент к Gemini, создавая его при первом обращении."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            proxy=LLM_PROXY,
+            timeout=120.0,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+    return _http_client
 
 
 class Message(BaseModel):
@@ -57,6 +135,8 @@ class ChatCompletionRequest(BaseModel):
     messages: List[Message]
     temperature: Optional[float] = 0.7
     api_key: Optional[str] = None
+    # TTL кэша ответа в секундах (None -> response_cache_ttl из конфига, 0 -> без кэша)
+    cache_ttl: Optional[float] = None
 
 class EmbeddingRequest(BaseModel):
     content: str
@@ -66,17 +146,21 @@ class EmbeddingRequest(BaseModel):
     api_key: Optional[str] = None
 
 
-def upload_file_to_gemini(file_path: str, api_key: str):
+async def upload_file_to_gemini(file_path: str, api_key: str):
     """
-    Uploads a file to Gemini using the SDK.
-    Returns the file URI and mime_type.
+    Загружает файл в Gemini Files API по REST (resumable upload) ключом запроса.
+    Ключ передаётся в самом запросе, а не через глобальный genai.configure:
+    параллельные запросы с разными ключами не перепутают владельца файла.
+    Возвращает file_uri и mime_type или None.
     """
     try:
-        genai.configure(api_key=api_key)
-        
-        # Check if file exists
-        if not os.path.exists(file_path):
-            print(f"File not found: {file_path}")
+        # Один stat вместо exists + проверки размера: отсутствующий и пустой
+        # файл (например, недокачанный) не отправляем в API вовсе.
+        try:
+            size = os.stat(file_path).st_size
+        except FileNotFoundError:
+            return None
+        if size == 0:
             return None
 
         # Determine mime type (basic)
@@ -88,24 +172,58 @@ def upload_file_to_gemini(file_path: str, api_key: str):
         elif ext == 'mp3': mime_type = "audio/mp3"
         elif ext == 'wav': mime_type = "audio/wav"
 
-        print(f"Uploading file: {file_path} ({mime_type})")
-        
-        # Upload
-        # Note: genai.upload_file handles large files automatically
-        myfile = genai.upload_file(file_path, mime_type=mime_type)
-        
-        print(f"Uploaded: {myfile.name} -> {myfile.uri}")
-        return {"file_uri": myfile.uri, "mime_type": myfile.mime_type}
+        logger.debug("Uploading file: {} ({}, {} bytes)", file_path, mime_type, size)
+
+        client = get_http_client()
+        # 1. Открываем сессию загрузки: в ответе — URL для самих байтов
+        start = await client.post(
+            GEMINI_UPLOAD_URL,
+            params={"key": api_key},
+            headers={
+                **JSON_HEADERS,
+                "X-Goog-Upload-Protocol": "resumable",
+                "X-Goog-Upload-Command": "start",
+                "X-Goog-Upload-Header-Content-Length": str(size),
+                "X-Goog-Upload-Header-Content-Type": mime_type,
+            },
+            content=orjson.dumps({"file": {"display_name": os.path.basename(file_path)}})
+        )
+        start.raise_for_status()
+        upload_url = start.headers["x-goog-upload-url"]
+
+        # 2. Отправляем файл целиком и завершаем загрузку (чтение диска — в потоке)
+        data = await asyncio.to_thread(Path(file_path).read_bytes)
+        resp = await client.post(
+            upload_url,
+            headers={"X-Goog-Upload-Offset": "0", "X-Goog-Upload-Command": "upload, finalize"},
+            content=data
+        )
+        resp.raise_for_status()
+        uploaded = orjson.loads(resp.content)["file"]
+
+        logger.debug("Uploaded: {} -> {}", uploaded.get("name"), uploaded["uri"])
+        return {"file_uri": uploaded["uri"], "mime_type": uploaded.get("mimeType", mime_type)}
 
     except Exception as e:
-        print(f"Upload failed: {e}")
+        logger.warning("Upload failed: {}: {}", file_path, e)
         return None
 
 
-def convert_messages_to_gemini_format(messages: List[Message], api_key: str) -> dict:
+async def convert_messages_to_gemini_format(messages: List[Message], api_key: str) -> dict:
     """
     Конвертирует сообщения в формат Gemini API, загружая файлы.
+    Загрузки идут параллельно на общем клиенте, порядок частей сохраняется.
     """
+    all_files = [file_path for msg in messages if msg.role == "user" and msg.files for file_path in msg.files]
+    results = await asyncio.gather(
+        *(upload_file_to_gemini(file_path, api_key) for file_path in all_files)
+    )
+    # Одна сводная строка на запрос вместо сообщения на каждый файл
+    skipped = [file_path for file_path, result in zip(all_files, results) if result is None]
+    if skipped:
+        logger.warning("Skipped {} of {} files (missing, empty or failed): {}", len(skipped), len(all_files), skipped[:10])
+    uploaded = iter(results)
+
     contents = []
     system_instruction = None
     
@@ -120,10 +238,10 @@ def convert_messages_to_gemini_format(messages: List[Message], api_key: str) ->
             if msg.content:
                 parts.append({"text": msg.content})
             
-            # 2. Upload and Add Files
+            # 2. Add Uploaded Files
             if msg.files:
-                for file_path in msg.files:
-                    file_data = upload_file_to_gemini(file_path, api_key)
+                for _ in msg.files:
+                    file_data = next(uploaded)
                     if file_data:
                         parts.append({
                             "file_data": {
@@ -152,6 +270,14 @@ def convert_messages_to_gemini_format(messages: List[Message], api_key: str) ->
 
 @app.post("/v1/chat/completions")
 async def chat_completions(request_body: ChatCompletionRequest, request: Request):
+    # Пустой запрос отклоняем до выдачи ключа и загрузки файлов: Gemini всё равно
+    # ответит 400, а попытка спишет квоту ключа
+    if not any(
+        msg.files or msg.content.strip()
+        for msg in request_body.messages if msg.role != "system"
+    ):
+        raise HTTPException(status_code=400, detail="Request has no user content")
+
     # Determine API Key (Header > Body > Env)
     user_provided_key = None
     auth_header = request.headers.get("Authorization")
@@ -174,6 +300,39 @@ async def chat_completions(request_body: ChatCompletionRequest, request: Request
         max_retries = total_keys if total_keys > 0 else 1
 
     last_error = None
+    # Минимальная подсказка Retry-After среди ответов 429 — отдаётся клиенту
+    retry_after = None
+
+    # Загрузка каждого файла — отдельный вызов API тем же ключом, что и генерация
+    # (грузятся только файлы user-сообщений — тот же фильтр, что в convert_messages_to_gemini_format)
+    calls_per_attempt = 1 + sum(len(msg.files) for msg in request_body.messages if msg.role == "user" and msg.files)
+
+    # Кэш ответов. Запросы с файлами не кэшируем: каждая загрузка уникальна.
+    cache_key = None
+    cache_ttl = request_body.cache_ttl
+    if cache_ttl is None:
+        cache_ttl = config_manager.get_float("response_cache_ttl", 10.0)
+    if cache_ttl > 0 and not any(msg.files for msg in request_body.messages):
+        cache_key = response_cache.make_key(
+            request_body.model,
+            request_body.temperature,
+            [[msg.role, msg.content] for msg in request_body.messages]
+        )
+        cached = response_cache.get(cache_key, cache_ttl)
+        if cached is not None:
+            return cached
+
+    # Пре-допуск по token bucket: если все ключи заняты, ждём недолго или сразу
+    # отвечаем 429, не тратя round-trip в Gemini ради заведомого отказа.
+    if not user_provided_key:
+        delay = key_manager.throttle_delay(calls_per_attempt)
+        if delay > 0:
+            if delay <= config_manager.get_float("key_wait_max", 5.0):
+                await asyncio.sleep(delay)
+            else:
+                last_error = "all keys throttled locally"
+                retry_after = delay
+                max_retries = 0
 
     for attempt in range(max_retries):
         try:
@@ -181,7 +340,7 @@ async def chat_completions(request_body: ChatCompletionRequest, request: Request
             if user_provided_key:
                 api_key = user_provided_key
             else:
-                api_key = key_manager.get_next_key()
+                api_key = key_manager.reserve(calls_per_attempt)
             
             if not api_key:
                 raise HTTPException(status_code=401, detail="No API Keys available in configuration")
@@ -196,52 +355,62 @@ async def chat_completions(request_body: ChatCompletionRequest, request: Request
             # Let's just use the timeout for now as it's cleaner.
             
             # Dynamic Timeout
-            timeout_val = float(config_manager.get("request_timeout", 120.0))
+            timeout_val = config_manager.get_float("request_timeout", 120.0)
             
             url = f"{GEMINI_API_URL}/{model_name}:generateContent?key={api_key}"
             
             # Convert messages (Uploads files using CURRENT key)
             # This ensures file permissions match the generation request key
-            payload = convert_messages_to_gemini_format(request_body.messages, api_key)
+            payload = await convert_messages_to_gemini_format(request_body.messages, api_key)
             
             payload["generationConfig"] = {
                 "temperature": request_body.temperature
             }
             
-            print(f"Calling Gemini API: model={model_name} (Attempt {attempt+1}/{max_retries})")
+            logger.debug("Calling Gemini API: model={} (Attempt {}/{})", model_name, attempt + 1, max_retries)
+            
+            # Общий клиент с явным прокси: соединение и TLS-сессия к Gemini переиспользуются
+            client = get_http_client()
+            # orjson кодирует историю в bytes заметно быстрее stdlib json, которым пользуется httpx
+            response = await client.post(url, content=orjson.dumps(payload), headers=JSON_HEADERS, timeout=timeout_val)
             
-            # Make request with explicit proxy
-            async with httpx.AsyncClient(proxy=LLM_PROXY, timeout=timeout_val) as client:
-                response = await client.post(url, json=payload)
+            if response.status_code != 200:
+                error_detail = response.text
+                logger.warning("Gemini API Error: {} - {:.500}", response.status_code, error_detail)
                 
-                if response.status_code != 200:
-                    error_detail = response.text
-                    print(f"Gemini API Error: {response.status_code} - {error_detail}")
+                # If 429 Resource Exhausted, try next key
+                if response.status_code == 429:
+                    last_error = f"429: {error_detail}"
+                    delay = parse_retry_after(response)
+                    if delay is not None:
+                        retry_after = delay if retry_after is None else min(retry_after, delay)
+                    if user_provided_key: # Cannot rotate user provided key
+                        break 
+                    if delay is not None:
+                        # Ключ не выдаётся, пока сервер не разрешит: без заведомо проигрышных попыток
+                        key_manager.mark_rate_limited(api_key, delay)
+                    logger.warning("Rate limit hit, rotating key...")
+                    continue # Try next key
                     
-                    # If 429 Resource Exhausted, try next key
-                    if response.status_code == 429:
-                        last_error = f"429: {error_detail}"
-                        if user_provided_key: # Cannot rotate user provided key
-                            break 
-                        print("Rate limit hit, rotating key...")
-                        continue # Try next key
-                        
-                    raise HTTPException(status_code=response.status_code, detail=error_detail)
-                
-                data = response.json()
+                raise HTTPException(status_code=response.status_code, detail=error_detail)
             
-            # Extract response text
-            candidates = data.get("candidates", [])
-            if not candidates:
-                # Handle empty response
-                print(f"Empty candidates: {data}")
-                raise HTTPException(status_code=500, detail="No response from Gemini (Safety?)")
+            # Ответ Gemini парсится прямо из bytes, без промежуточного декодирования в str
+            data = orjson.loads(response.content)
             
-            content = candidates[0].get("content", {})
-            parts = content.get("parts", [])
-            text = parts[0].get("text", "") if parts else ""
+            # Extract response text
+            candidates = data.get("candidates") or [{}]
+            parts = candidates[0].get("content", {}).get("parts", [])
+            # Ответ может прийти несколькими частями: склеиваем все текстовые за один проход
+            text = "".join(part["text"] for part in parts if "text" in part)
+
+            reason = classify_empty_response(data, text)
+            if reason:
+                level, detail = EMPTY_RESPONSES[reason]
+                logger.log(level, "Gemini empty response ({}): {!s:.500}", reason, data)
+                if detail:
+                    raise HTTPException(status_code=500, detail=detail)
             
-            return {
+            result = {
                 "choices": [
                     {
                         "message": {
@@ -251,29 +420,45 @@ async def chat_completions(request_body: ChatCompletionRequest, request: Request
                     }
                 ]
             }
+            # Пустой ответ не кэшируем: повтор должен снова сходить в Gemini,
+            # а не получать ту же пустоту из кэша (или как stale при 429)
+            if cache_key and not reason:
+                response_cache.set(cache_key, result)
+            return result
             
         except HTTPException:
             if attempt == max_retries - 1:
                 raise
-        except Exception as e:
-            print(f"Error attempt {attempt}: {e}")
+        except _RETRYABLE as e:
+            logger.warning("Error attempt {}: {}", attempt, e)
             last_error = str(e)
             if attempt == max_retries - 1:
-                import traceback
-                traceback.print_exc()
                 raise HTTPException(status_code=500, detail=f"All retries failed. Last error: {last_error}")
+        except Exception as e:
+            # Ошибка не сетевая (ответ не того формата, баг): другой ключ не поможет
+            logger.exception("Gemini request failed: {}", e)
+            raise HTTPException(status_code=500, detail=f"Gemini request failed: {e}")
 
     # If we fell out of loop
-    raise HTTPException(status_code=429, detail=f"Rate limit exceeded on all keys. Last error: {last_error}")
+    if cache_key:
+        stale = response_cache.get_stale(cache_key)
+        if stale is not None:
+            logger.warning("Rate limit on all keys, serving stale cached response")
+            return stale
+    headers = {"Retry-After": str(math.ceil(retry_after))} if retry_after is not None else None
+    raise HTTPException(status_code=429, detail=f"Rate limit exceeded on all keys. Last error: {last_error}", headers=headers)
 
 
 @app.get("/health")
 async def health():
-    return {"status": "ok", "proxy": LLM_PROXY or "none"}
+    return {"status": "ok", "proxy": LLM_PROXY or "none", "keys": key_manager.get_stats()}
 
 
 @app.post("/v1/embeddings")
 async def create_embedding(request_body: EmbeddingRequest, request: Request):
+    if not request_body.content.strip():
+        raise HTTPException(status_code=400, detail="Content is empty")
+
     # Auth (Reuse logic mostly)
     user_provided_key = None
     auth_header = request.headers.get("Authorization")
@@ -288,6 +473,21 @@ async def create_embedding(request_body: EmbeddingRequest, request: Request):
         max_retries = total_keys if total_keys > 0 else 1
 
     last_error = None
+    retry_after = None
+
+    # Тот же REST-путь и общий клиент, что у чата
+    # и с честным статусом 429 вместо поиска подстрок в тексте исключения SDK
+    model_name = request_body.model.removeprefix("models/")
+    url = f"{GEMINI_API_URL}/{model_name}:embedContent"
+    payload = {
+        "model": f"models/{model_name}",
+        "content": {"parts": [{"text": request_body.content}]},
+        "taskType": request_body.task_type.upper(),
+    }
+    if request_body.output_dimensionality:
+        payload["outputDimensionality"] = request_body.output_dimensionality
+    # Тело одинаково для всех ключей: сериализуем один раз
+    body = orjson.dumps(payload)
 
     for attempt in range(max_retries):
         try:
@@ -299,42 +499,43 @@ async def create_embedding(request_body: EmbeddingRequest, request: Request):
             if not api_key:
                 raise HTTPException(status_code=401, detail="API Key not provided")
 
-            genai.configure(api_key=api_key)
-            
             # Call Gemini Embedding API
-            print(f"Generating embedding for task={request_body.task_type} (Attempt {attempt+1}/{max_retries})")
-            
-            result = genai.embed_content(
-                model=request_body.model,
-                content=request_body.content,
-                task_type=request_body.task_type,
-                output_dimensionality=request_body.output_dimensionality
-            )
+            logger.debug("Generating embedding for task={} (Attempt {}/{})", request_body.task_type, attempt + 1, max_retries)
             
+            client = get_http_client()
+            response = await client.post(url, params={"key": api_key}, content=body, headers=JSON_HEADERS, timeout=30.0)
+
+            if response.status_code == 429:
+                last_error = f"429: {response.text}"
+                delay = parse_retry_after(response)
+                if delay is not None:
+                    retry_after = delay if retry_after is None else min(retry_after, delay)
+                if user_provided_key:
+                    break
+                if delay is not None:
+                    key_manager.mark_rate_limited(api_key, delay)
+                logger.warning("Rate limit hit (embedding), rotating key...")
+                continue
+            if response.status_code != 200:
+                raise HTTPException(status_code=response.status_code, detail=response.text)
+
             return {
-                "embedding": result['embedding'],
+                "embedding": orjson.loads(response.content)["embedding"]["values"],
                 "model": request_body.model
             }
 
-        except Exception as e:
-            print(f"Embedding Error attempt {attempt}: {e}")
+        except HTTPException:
+            if attempt == max_retries - 1:
+                raise
+        except _RETRYABLE as e:
             last_error = str(e)
-            
-            # Check for Rate Limit in exception message
-            if "429" in str(e) or "ResourceExhausted" in str(e) or "quota" in str(e).lower():
-                if user_provided_key:
-                    break
-                print("Rate limit hit (embedding), rotating key...")
-                continue
-            
-            # If other error, maybe break or continue?
-            # Safe to retry for 503s etc, but SDK might hide status codes.
-            # We continue if multiple keys available.
-            
+            logger.warning("Embedding Error attempt {}: {}", attempt, last_error)
             if attempt == max_retries - 1:
-                import traceback
-                traceback.print_exc()
                 raise HTTPException(status_code=500, detail=str(e))
+        except Exception as e:
+            logger.exception("Embedding request failed: {}", e)
+            raise HTTPException(status_code=500, detail=str(e))
     
-    raise HTTPException(status_code=429, detail=f"Rate limit exceeded (embeddings). Last error: {last_error}")
+    headers = {"Retry-After": str(math.ceil(retry_after))} if retry_after is not None else None
+    raise HTTPException(status_code=429, detail=f"Rate limit exceeded (embeddings). Last error: {last_error}", headers=headers)
 
@@ -0,0 +1,52 @@
+"""
+Кэш ответов LLM с TTL и отдачей устаревших записей при rate limit.
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class ResponseCache:
+    """
+    LRU-кэш ответов Gemini.
+
+    Свежесть записи проверяется по TTL, который передаётся при чтении
+    (у чата и у аналитических вызовов он разный). Просроченные записи
+    ещё stale_ttl секунд хранятся для отдачи, если все ключи упёрлись в 429.
+    """
+
+    def __init__(self, maxsize: int = 512, stale_ttl: float = 600.0):
+        self.maxsize = maxsize
+        self.stale_ttl = stale_ttl
+        self._data: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    @staticmethod
+    def make_key(model: str, temperature: Optional[float], messages: list) -> str:
+        raw = json.dumps([model, temperature, messages], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str, ttl: float) -> Optional[dict]:
+        """Возвращает запись, если она моложе ttl секунд."""
+        item = self._data.get(key)
+        if item is None or time.monotonic() - item[0] > ttl:
+            return None
+        self._data.move_to_end(key)
+        return item[1]
+
+    def get_stale(self, key: str) -> Optional[dict]:
+        """Возвращает запись в пределах stale_ttl (fallback при 429)."""
+        item = self._data.get(key)
+        if item is None or time.monotonic() - item[0] > self.stale_ttl:
+            return None
+        return item[1]
+
+    def set(self, key: str, value: dict):
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+response_cache = ResponseCache()
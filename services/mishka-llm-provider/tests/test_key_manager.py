@@ -0,0 +1,83 @@
+from src.key_manager import KeyManager
+
+
+def make_manager(monkeypatch, keys="k1,k2,k3"):
+    monkeypatch.setenv("GOOGLE_API_KEYS", keys)
+    return KeyManager()
+
+
+def test_rotation_is_round_robin_on_equal_usage(monkeypatch):
+    """При равных счётчиках ключи выдаются по кругу"""
+    km = make_manager(monkeypatch)
+    assert [km.get_next_key() for _ in range(6)] == ["k1", "k2", "k3", "k1", "k2", "k3"]
+    assert km.usage_counts == [2, 2, 2]
+
+
+def test_least_used_key_is_preferred(monkeypatch):
+    """После сброса выбирается ключ с минимальным счётчиком"""
+    km = make_manager(monkeypatch)
+    km.get_next_key()
+    km.get_next_key()
+    # k3 ещё не использовался
+    assert km.get_next_key() == "k3"
+
+
+def test_no_keys_returns_none(monkeypatch):
+    for var in ("GOOGLE_API_KEYS", "GEMINI_API_KEYS", "GOOGLE_API_KEY", "GEMINI_API_KEY"):
+        monkeypatch.delenv(var, raising=False)
+    km = KeyManager()
+    assert km.get_next_key() is None
+
+
+def test_reset_daily_counts(monkeypatch):
+    km = make_manager(monkeypatch)
+    for _ in range(4):
+        km.get_next_key()
+    km.reset_daily_counts()
+    assert km.usage_counts == [0, 0, 0]
+    assert km.get_next_key() == "k1"
+
+
+def test_get_stats_is_snapshot(monkeypatch):
+    km = make_manager(monkeypatch)
+    km.get_next_key()
+    stats = km.get_stats()
+    km.get_next_key()
+    assert stats["usage"] == [1, 0, 0]
+    assert not any("k1" in str(value) for value in stats.values())
+
+
+def test_reserve_charges_n_calls(monkeypatch):
+    """reserve(n) списывает n вызовов на один ключ"""
+    km = make_manager(monkeypatch)
+    assert km.reserve(3) == "k1"
+    assert km.usage_counts == [3, 0, 0]
+    assert [km.get_next_key() for _ in range(4)] == ["k2", "k3", "k2", "k3"]
+
+
+def test_rate_limited_key_is_skipped(monkeypatch):
+    """Ключ с Retry-After не выдаётся, пока не истечёт пауза"""
+    km = make_manager(monkeypatch)
+    km.mark_rate_limited("k1", 60)
+    assert [km.get_next_key() for _ in range(4)] == ["k2", "k3", "k2", "k3"]
+    assert km.usage_counts == [0, 2, 2]
+    assert km.get_stats()["cooling_down"] == 1
+
+
+def test_all_keys_cooling_falls_back_to_least_used(monkeypatch):
+    km = make_manager(monkeypatch)
+    km.get_next_key()
+    for key in ("k1", "k2", "k3"):
+        km.mark_rate_limited(key, 60)
+    assert km.get_next_key() == "k2"
+    assert sorted(entry[1] for entry in km._heap) == [0, 1, 2]
+
+
+def test_token_bucket_limits_rpm(monkeypatch):
+    """При GEMINI_KEY_RPM ключ с пустым bucket не выдаётся"""
+    monkeypatch.setenv("GEMINI_KEY_RPM", "2")
+    km = make_manager(monkeypatch, keys="k1,k2")
+    assert km.throttle_delay() == 0
+    assert [km.reserve(2), km.reserve(2)] == ["k1", "k2"]
+    # Оба bucket пусты: до следующего токена около 30 секунд
+    assert 29 < km.throttle_delay() <= 30
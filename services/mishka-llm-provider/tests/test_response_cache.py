@@ -0,0 +1,27 @@
+from unittest.mock import patch
+
+from src.response_cache import ResponseCache
+
+
+def test_fresh_and_stale_lookup():
+    """Запись свежая в пределах ttl и доступна как stale после него"""
+    cache = ResponseCache(stale_ttl=100)
+    key = ResponseCache.make_key("gemini", 0.7, [["user", "hi"]])
+    with patch("src.response_cache.time.monotonic", return_value=0.0):
+        cache.set(key, {"answer": 1})
+    with patch("src.response_cache.time.monotonic", return_value=5.0):
+        assert cache.get(key, ttl=10) == {"answer": 1}
+    with patch("src.response_cache.time.monotonic", return_value=50.0):
+        assert cache.get(key, ttl=10) is None
+        assert cache.get_stale(key) == {"answer": 1}
+    with patch("src.response_cache.time.monotonic", return_value=500.0):
+        assert cache.get_stale(key) is None
+
+
+def test_lru_eviction():
+    cache = ResponseCache(maxsize=2)
+    cache.set("a", {})
+    cache.set("b", {})
+    cache.set("c", {})
+    assert cache.get_stale("a") is None
+    assert cache.get_stale("c") == {}
@@ -1,13 +1,11 @@
 import requests
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
 
 PROXY_URL = "http://localhost:8000/v1/embeddings"
-API_KEY = os.getenv("GEMINI_API_KEY")
 
 def test_embedding():
+    # Ключ читается здесь, а не при импорте: .env загружается только при запуске скрипта
+    api_key = os.getenv("GEMINI_API_KEY")
     print(f"Testing Embedding on {PROXY_URL}...")
     
     payload = {
@@ -16,7 +14,7 @@ def test_embedding():
     }
     
     headers = {
-        "Authorization": f"Bearer {API_KEY}"
+        "Authorization": f"Bearer {api_key}"
     }
     
     try:
@@ -32,4 +30,7 @@ def test_embedding():
         print(f"Failed to connect: {e}")
 
 if __name__ == "__main__":
+    # dotenv нужен только при ручном запуске
+    from dotenv import load_dotenv
+    load_dotenv()
     test_embedding()
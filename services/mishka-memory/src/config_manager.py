@@ -65,7 +65,7 @@ class ConfigManager:
                 async for message in queue_iter:
                     async with message.process():
                         try:
-                            data = json.loads(message.body.decode())
+                            data = json.loads(message.body)
                             if data.get("service") == self.service_name:
                                 key = data["key"]
                                 value = data["value"]
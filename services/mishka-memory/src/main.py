@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from datetime import datetime
@@ -7,10 +7,14 @@ from src.database import get_db, init_db
 from src.redis_manager import redis_manager
 from src.models import User
 from src.schemas import UserCreate, UserResponse, HistoryMessage, ContextResponse
+import hashlib
 import httpx
 import os
+from functools import cache
+from pathlib import Path
 from pydantic import BaseModel
-from src.qdrant import qdrant_manager
+from typing import List, Optional
+from src.qdrant import get_qdrant_manager
 from src.log_handler import setup_logger, start_log_handler, stop_log_handler
 
 LLM_EMBEDDING_URL = os.getenv("LLM_EMBEDDING_URL", "http://mishka-llm-provider:8000/v1/embeddings")
@@ -21,10 +25,27 @@ class FactRequest(BaseModel):
     text: str
     metadata: dict = {}
 
+class DeleteFactsRequest(BaseModel):
+    ids: List[str]
+
 class SearchRequest(BaseModel):
     query: str
     limit: int = 5
 
+# Манифесты инструментов хранятся готовым JSON-файлом рядом с модулем
+TOOLS_CONFIG_PATH = Path(__file__).parent / "tools.json"
+
+@cache
+def _load_tools_manifest() -> tuple[bytes, str]:
+    """
+    Возвращает bytes манифестов и их ETag. Файл читается и хэшируется один раз,
+    при первом запросе /tools/config, а не при импорте модуля; дальше bytes
+    отдаются как есть, без сериализации на запрос.
+    """
+    body = TOOLS_CONFIG_PATH.read_bytes()
+    # ETag позволяет клиентам не перекачивать и не перепарсивать неизменившийся список
+    return body, '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+
 app = FastAPI()
 
 @app.on_event("startup")
@@ -96,43 +117,17 @@ async def get_active_chats():
     return await redis_manager.get_active_chats()
 
 @app.get("/tools/config")
-async def get_tools_config():
+async def get_tools_config(request: Request):
     """Return available tools manifests."""
-    return [
-        {
-            "name": "get_weather",
-            "description": "Узнать текущую погоду в указанном городе.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "city": {
-                        "type": "string",
-                        "description": "Название города (например, Москва, Токио)"
-                    }
-                },
-                "required": ["city"]
-            },
-            "endpoint": "http://tool-weather:8000/weather"
-        },
-        {
-            "name": "remember_fact",
-            "description": "Сохранить факт в долгосрочную память. Используй, если пользователь просит запомнить или сообщает важную информацию о себе.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "text": {
-                        "type": "string",
-                        "description": "Текст факта (например, 'Влад любит суши')."
-                    }
-                },
-                "required": ["text"]
-            },
-            "endpoint": "http://tool-memory:8000/run"
-        }
-    ]
+    body, etag = _load_tools_manifest()
+    headers = {"ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.post("/facts/add")
 async def add_fact(request: FactRequest):
+    qdrant_manager = get_qdrant_manager()
     if not qdrant_manager:
         raise HTTPException(status_code=503, detail="Vector DB not available")
     
@@ -161,6 +156,7 @@ async def add_fact(request: FactRequest):
 
 @app.post("/facts/search")
 async def search_facts(request: SearchRequest):
+    qdrant_manager = get_qdrant_manager()
     if not qdrant_manager:
         raise HTTPException(status_code=503, detail="Vector DB not available")
 
@@ -187,12 +183,30 @@ async def search_facts(request: SearchRequest):
     return {"results": results}
 
 @app.get("/facts/all")
-async def get_all_facts(limit: int = 1000):
+async def list_facts(response: Response, limit: int = 1000, offset: Optional[str] = None, with_vectors: bool = True):
+    """
+    Страница фактов. Тело — список, как раньше; offset следующей страницы
+    отдаётся в заголовке X-Next-Offset (нет заголовка — это последняя страница).
+    """
+    qdrant_manager = get_qdrant_manager()
     if not qdrant_manager: return []
-    return qdrant_manager.get_all_facts(limit=limit)
+    facts, next_offset = qdrant_manager.get_facts_page(limit=limit, offset=offset, with_vectors=with_vectors)
+    if next_offset is not None:
+        response.headers["X-Next-Offset"] = str(next_offset)
+    return facts
+
+@app.post("/facts/delete")
+async def delete_facts(request: DeleteFactsRequest):
+    """Удаляет несколько фактов за один вызов (например, весь слитый кластер)."""
+    qdrant_manager = get_qdrant_manager()
+    if not qdrant_manager: return {"status": "error"}
+    if request.ids:
+        qdrant_manager.delete_facts(request.ids)
+    return {"status": "deleted", "count": len(request.ids)}
 
 @app.delete("/facts/{fact_id}")
 async def delete_fact(fact_id: str):
+    qdrant_manager = get_qdrant_manager()
     if not qdrant_manager: return {"status": "error"}
     qdrant_manager.delete_fact(fact_id)
     return {"status": "deleted"}
@@ -3,7 +3,7 @@ from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from qdrant_client.http.models import Distance, VectorParams, PointStruct
 import uuid
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 
 import qdrant_client
 
@@ -76,16 +76,19 @@ class QdrantManager:
             for hit in results
         ]
 
-    def get_all_facts(self, limit: int = 1000) -> List[Dict]:
-        """Iterates over facts (Scroll)."""
-        # Scroll API
-        results, _ = self.client.scroll(
+    def get_facts_page(self, limit: int = 1000, offset=None, with_vectors: bool = True) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Одна страница фактов (Scroll) и offset следующей (None — страниц больше нет).
+        Векторы нужны только для кластеризации: без них страница в разы легче.
+        """
+        results, next_offset = self.client.scroll(
             collection_name=COLLECTION_NAME,
             limit=limit,
+            offset=offset,
             with_payload=True,
-            with_vectors=True # Needed for clustering
+            with_vectors=with_vectors
         )
-        return [
+        facts = [
             {
                 "id": p.id,
                 "vector": p.vector,
@@ -94,19 +97,34 @@ class QdrantManager:
             }
             for p in results
         ]
+        return facts, next_offset
 
     def delete_fact(self, fact_id: str):
         """Deletes a fact by ID."""
+        self.delete_facts([fact_id])
+
+    def delete_facts(self, fact_ids: List[str]):
+        """Удаляет пачку фактов одним запросом к Qdrant."""
         self.client.delete(
             collection_name=COLLECTION_NAME,
             points_selector=models.PointIdsList(
-                points=[fact_id]
+                points=fact_ids
             )
         )
 
-# Global instance
-try:
-    qdrant_manager = QdrantManager()
-except Exception as e:
-    print(f"Failed to init QdrantManager: {e}")
-    qdrant_manager = None
+# Global instance (lazy)
+_qdrant_manager = None
+
+def get_qdrant_manager():
+    """
+    Возвращает QdrantManager, создавая его при первом обращении.
+    Подключение и проверка коллекции не выполняются при импорте модуля,
+    а неудачная инициализация повторяется при следующем запросе.
+    """
+    global _qdrant_manager
+    if _qdrant_manager is None:
+        try:
+            _qdrant_manager = QdrantManager()
+        except Exception as e:
+            print(f"Failed to init QdrantManager: {e}")
+    return _qdrant_manager
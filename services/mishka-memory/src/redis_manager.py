@@ -1,4 +1,4 @@
-import json
+import orjson
 from redis import asyncio as aioredis
 from src.config import settings
 
@@ -22,7 +22,7 @@ class RedisManager:
             "user_name": user_name,
             "created_at": created_at
         }
-        message = json.dumps(message_data)
+        message = orjson.dumps(message_data)
         
         async with self.redis.pipeline() as pipe:
             pipe.rpush(key, message)
@@ -43,26 +43,29 @@ class RedisManager:
         read_limit = limit if not hours else 1000 
         
         messages = await self.redis.lrange(key, -read_limit, -1)
-        parsed = [json.loads(m) for m in messages]
+        # orjson: история читается на каждый запрос контекста (до 1000 сообщений)
+        parsed = [orjson.loads(m) for m in messages]
         
         if hours:
             import datetime
             now = datetime.datetime.utcnow()
             cutoff = now - datetime.timedelta(hours=hours)
-            
-            filtered = []
-            for msg in parsed:
+
+            def is_recent(msg) -> bool:
                 ts_str = msg.get("created_at") or msg.get("timestamp")
-                if ts_str:
-                    try:
-                        ts = datetime.datetime.fromisoformat(ts_str)
-                        if ts > cutoff:
-                            filtered.append(msg)
-                    except:
-                        filtered.append(msg) # Keep if no valid date
-                else:
-                    filtered.append(msg)
-            parsed = filtered
+                if not ts_str:
+                    return True
+                try:
+                    return datetime.datetime.fromisoformat(ts_str) > cutoff
+                except:
+                    return True # Keep if no valid date
+
+            # rpush хранит сообщения в хронологическом порядке: если самое старое
+            # с датой уже моложе cutoff, остальные тоже — отдаём список без прохода.
+            # Результат может быть тем же списком; вызывающий код только читает его.
+            first = parsed[0] if parsed else None
+            if not (first and (first.get("created_at") or first.get("timestamp")) and is_recent(first)):
+                parsed = [msg for msg in parsed if is_recent(msg)]
             
         return parsed # Already limited by lrange mostly, filtered by date
 
@@ -76,3 +76,17 @@ async def test_get_context(mock_redis, mock_db):
     data = response.json()
     assert len(data["history"]) == 1
     assert data["history"][0]["content"] == "Hello"    
+
+@pytest.mark.asyncio
+async def test_tools_config_etag(mock_redis):
+    """/tools/config отдаёт манифест с ETag, а при совпадении If-None-Match — 304"""
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        response = await ac.get("/tools/config")
+        assert response.status_code == 200
+        assert isinstance(response.json(), list)
+        etag = response.headers["etag"]
+
+        cached = await ac.get("/tools/config", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag